@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Runs the same graph in the piece model (sets of piece ids) and in the
+coded model (see mtsim/coded.py), and compares their completion times
+and the memory the simulation allocates. The coded model is run with
+real coefficient vectors (exact), and, for reference, with its two
+estimates of useful blocks, which only keep ranks and bound the exact
+completion time from above (nested) and below (generic).
+"""
+
+import argparse
+import logging
+import tracemalloc
+from prettytable import PrettyTable
+
+from mtsim.coded import CODED_RELAXATIONS, MODELS, run_coded_simulation
+from mtsim.relaxations import RELAXATIONS
+from mtsim.simulation import run_simulation
+from mtsim.topocache import cached_graph
+
+logging.basicConfig(filename="example.log", level=logging.INFO)
+
+
+def measure(run):
+    """
+    Returns what run() returns, and the peak memory in bytes it
+    allocated.
+    """
+    tracemalloc.start()
+    try:
+        result = run()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pieces", type=int, default=200, help="number of pieces (the exact coded model takes O(pieces^2) per block)")
+    parser.add_argument("--nodes", type=int, default=10, help="number of nodes of a boring graph")
+    parser.add_argument("--bw", type=int, default=10, help="bandwidth of every node of a boring graph")
+    parser.add_argument("--link-cap", type=int, default=5, help="capacity of every link of a boring graph")
+    parser.add_argument("--highlow", type=int, nargs=6, metavar=("HIGH", "LOW", "HIGH_BW", "LOW_BW", "HIGH_CAP", "LOW_CAP"), help="use make_highlow_graph with these arguments instead")
+    parser.add_argument("--relax", choices=CODED_RELAXATIONS.keys(), default="greedy")
+    parser.add_argument("--max-time", type=int, default=None, help="give up after this many time steps")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random choices of the piece model and the exact coded model")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS), help="coded models to run")
+    args = parser.parse_args()
+
+    all_data = set(range(args.pieces))
+
+    def make():
+        if args.highlow:
+            names = ("num_high_bw_nodes", "num_low_bw_nodes", "high_bw", "low_bw", "high_cap", "low_cap")
+            return cached_graph("highlow", all_data, **dict(zip(names, args.highlow)))
+        return cached_graph(
+            "boring",
+            all_data,
+            num_nodes=args.nodes,
+            bandwidth=args.bw,
+            link_cap=args.link_cap,
+        )
+
+    G = make()
+    piece_time, piece_memory = measure(
+        lambda: run_simulation(
+            G,
+            all_data,
+            RELAXATIONS[args.relax],
+            max_time=args.max_time,
+            trusted=True,
+            seed=args.seed,
+        )
+    )
+
+    t = PrettyTable(["Model", "Completion time", "vs. pieces", "Peak memory (KiB)"])
+    t.add_row(["Pieces", piece_time, "100.0%", piece_memory // 1024])
+
+    for model in args.models:
+        G = make()
+        coded_time, coded_memory = measure(
+            lambda: run_coded_simulation(
+                G,
+                len(all_data),
+                CODED_RELAXATIONS[args.relax],
+                max_time=args.max_time,
+                model=model,
+                seed=args.seed,
+            )
+        )
+        t.add_row(
+            [
+                "Coded ({})".format(model),
+                coded_time,
+                "{:.1%}".format(coded_time / max(piece_time, 1)),
+                coded_memory // 1024,
+            ]
+        )
+
+    print(t)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Runs a graph both in the simulator and on a swarm of local peer
+processes, and compares the predicted and measured completion times.
+"""
+
+import argparse
+import logging
+from prettytable import PrettyTable
+
+from mtsim.emulator import run_emulation
+from mtsim.graph import make_boring_graph
+from mtsim.relaxations import RELAXATIONS
+
+logging.basicConfig(filename="example.log", level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=5, help="number of peers")
+    parser.add_argument("--pieces", type=int, default=40, help="number of pieces")
+    parser.add_argument("--bw", type=int, default=4, help="bandwidth of every peer, in pieces per time step")
+    parser.add_argument("--link-cap", type=int, default=2, help="capacity of every link, in pieces per time step")
+    parser.add_argument("--relax", choices=RELAXATIONS.keys(), default="greedy")
+    parser.add_argument("--piece-size", type=int, default=64 * 1024, help="size of a piece in bytes")
+    parser.add_argument("--tick-seconds", type=float, default=0.1, help="wall-clock length of a time step")
+    parser.add_argument("--max-time", type=int, default=None, help="give up on the simulation after this many time steps")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds to wait for the swarm to complete")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random choices")
+    args = parser.parse_args()
+
+    all_data = set(range(args.pieces))
+    G = make_boring_graph(args.nodes, all_data, args.bw, args.link_cap)
+
+    predicted, measured, finished = run_emulation(
+        G,
+        all_data,
+        RELAXATIONS[args.relax],
+        piece_size=args.piece_size,
+        tick_seconds=args.tick_seconds,
+        seed=args.seed,
+        max_time=args.max_time,
+        timeout=args.timeout,
+    )
+
+    t = PrettyTable(["", "Completion time"])
+    t.add_row(["Simulated", predicted])
+    t.add_row(["Emulated (measured)", "{:.2f}".format(measured)])
+    t.add_row(["Emulated (mean over peers)", "{:.2f}".format(sum(finished) / len(finished))])
+    print(t)
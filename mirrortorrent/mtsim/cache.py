@@ -0,0 +1,13 @@
+"""
+Where mtsim keeps what it computes once and reuses across runs, like
+broadcast schedules (see schedules.py) and topologies (see
+topocache.py).
+
+Set the MTSIM_CACHE_DIR environment variable to move the cache.
+"""
+
+import os
+
+CACHE_DIR = os.environ.get(
+    "MTSIM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mtsim")
+)
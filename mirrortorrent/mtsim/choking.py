@@ -0,0 +1,94 @@
+"""
+State for the tit-for-tat choking relaxation (see relax_choking).
+
+Like a real BitTorrent client, every node only uploads to the few peers
+it has unchoked: the peers it has recently downloaded from the fastest
+(or, once it has all the data, uploaded to the fastest), plus one
+optimistically unchoked peer that is rotated at random. All the
+bookkeeping is done in nodes x nodes NumPy arrays that are updated for
+all nodes at once, at the start of every time step.
+"""
+
+import numpy as np
+from .utils import *
+
+
+class ChokingState:
+    """
+    slots: Number of peers a node uploads to, including the
+           optimistic unchoke.
+    rechoke_interval: Time steps between choosing the unchoked peers
+                      by rate (10 seconds in BitTorrent).
+    optimistic_interval: Time steps between rotating the optimistic
+                         unchoke (30 seconds in BitTorrent).
+    decay: Weight of the old rate in the rolling rates. Every time
+           step, rate = decay * rate + (1 - decay) * transferred.
+    """
+
+    def __init__(
+        self, G, slots=4, rechoke_interval=10, optimistic_interval=30, decay=0.8
+    ):
+        num_nodes = len(G)
+        self.slots = slots
+        self.rechoke_interval = rechoke_interval
+        self.optimistic_interval = optimistic_interval
+        self.decay = decay
+
+        self.neighbors = np.zeros((num_nodes, num_nodes), dtype=bool)
+        for node, links in enumerate(G.links):
+            self.neighbors[node, list(links)] = True
+
+        # rates[i, j] and transferred[i, j] are about data sent by i to j.
+        self.rates = np.zeros((num_nodes, num_nodes), dtype=np.float32)
+        self.transferred = np.zeros((num_nodes, num_nodes), dtype=np.int32)
+        self.unchoked = np.zeros((num_nodes, num_nodes), dtype=bool)
+        self.optimistic = np.full(num_nodes, -1, dtype=np.int64)
+        self.current = np.zeros((num_nodes, num_nodes), dtype=bool)
+        self.time = None
+
+    def update(self, G, all_data):
+        """
+        Folds the last time step's transfers into the rolling rates,
+        and rechokes and rotates the optimistic unchokes when due.
+        """
+        time = G.graph["time"]
+        if self.time is not None:
+            self.rates *= self.decay
+            self.rates += (1 - self.decay) * self.transferred
+            self.transferred[:] = 0
+        self.time = time
+
+        rng = get_rng(G)
+        complete = np.fromiter(
+            (len(state.data) == len(all_data) for state in G.states),
+            dtype=bool,
+            count=len(G),
+        )
+        # Only peers that still need data are interested in being unchoked.
+        interested = self.neighbors & ~complete[None, :]
+
+        if time % self.rechoke_interval == 0:
+            # Nodes still downloading reward the peers they download from
+            # the fastest; complete nodes prefer the peers they upload to
+            # the fastest. Ties are broken at random.
+            score = np.where(complete[:, None], self.rates, self.rates.T)
+            score = score + 1e-6 * rng.random(score.shape)
+            score[~interested] = -np.inf
+
+            num_regular = min(max(self.slots - 1, 0), len(G) - 1)
+            self.unchoked[:] = False
+            if num_regular:
+                top = np.argpartition(-score, num_regular - 1, axis=1)[:, :num_regular]
+                rows = np.arange(len(G))[:, None]
+                self.unchoked[rows, top] = np.isfinite(score[rows, top])
+
+        if time % self.optimistic_interval == 0:
+            # Pick a random interested peer that is not unchoked yet.
+            choked = interested & ~self.unchoked
+            keys = np.where(choked, rng.random(choked.shape), -1)
+            self.optimistic = np.where(keys.max(axis=1) >= 0, keys.argmax(axis=1), -1)
+
+        unchoked = self.unchoked.copy()
+        has_optimistic = self.optimistic >= 0
+        unchoked[has_optimistic, self.optimistic[has_optimistic]] = True
+        self.current = unchoked & interested
@@ -0,0 +1,322 @@
+"""
+A coded-data model of the simulation.
+
+Instead of pieces with ids, the data is k pieces encoded with random
+linear network coding: every block a node sends is a random combination
+of the blocks it holds, and a node is complete once it holds any k
+independent blocks. Nothing is ever rare, so there is no end game
+waiting for the last few pieces.
+
+How many of the blocks s sends r are useful (independent of what r
+holds) depends on how much the spaces spanned by their blocks overlap.
+There are three models of it (see MODELS):
+
+- Exact (the default): every node keeps the coefficient vectors of its
+  blocks over GF(FIELD), in reduced row echelon form (see Subspace).
+  Every block sent is a real random combination of the sender's
+  blocks, and a sender only sends r blocks that are independent of
+  what r holds, as if r told it when it stops being interested. Every
+  node takes O(k^2) memory and every block O(k^2) time, so this is for
+  moderate k.
+- Nested: only ranks are kept, assuming the space of the node with the
+  lower rank lies within the other's, as when all blocks flow down a
+  chain. s can then send r rank(s) - rank(r) useful blocks, and none if
+  rank(s) <= rank(r). This never overcounts, so completion times are
+  upper bounds.
+- Generic: only ranks are kept, assuming the spaces are in general
+  position, as if every block were a fresh combination of all the
+  pieces. They then overlap in max(0, rank(s) + rank(r) - k)
+  dimensions, so s can send r min(rank(s), k - rank(r)) useful blocks.
+  This ignores that r may have got its blocks from s, so completion
+  times are lower bounds.
+
+The state of the whole swarm is a few NumPy vectors (see CodedSwarm),
+plus a Subspace per node in the exact model, and the relax methods
+take O(degree) per node, times the cost of every block in the exact
+model.
+"""
+
+import logging
+import math
+import numpy as np
+
+
+# The exact model works over GF(FIELD), the largest prime below 2**16,
+# so that the sum of k products of two elements fits in an int64.
+FIELD = 65521
+
+MODELS = ("exact", "nested", "generic")
+
+
+class Subspace:
+    """
+    A subspace of GF(FIELD)^k, as the rows of a matrix in reduced row
+    echelon form: every row has a 1 in its pivot column, which is 0 in
+    every other row.
+    """
+
+    def __init__(self, k):
+        self.rows = np.zeros((0, k), dtype=np.int64)
+        self.pivots = []
+
+    def __len__(self):
+        return len(self.pivots)
+
+    def reduce(self, vector):
+        """
+        Returns `vector` minus its projection on the subspace, which is
+        zero if and only if `vector` is in the subspace.
+        """
+        if not self.pivots:
+            return vector
+        return (vector - vector[self.pivots] @ self.rows) % FIELD
+
+    def add(self, reduced):
+        """
+        Adds a vector returned by `reduce` to the subspace. Returns
+        whether the subspace grew (the vector was not zero).
+        """
+        nonzero = np.flatnonzero(reduced)
+        if not len(nonzero):
+            return False
+
+        pivot = int(nonzero[0])
+        row = reduced * pow(int(reduced[pivot]), FIELD - 2, FIELD) % FIELD
+        if self.pivots:
+            self.rows = (self.rows - np.outer(self.rows[:, pivot], row)) % FIELD
+        self.rows = np.vstack((self.rows, row))
+        self.pivots.append(pivot)
+        return True
+
+
+class CodedSwarm:
+    """
+    The state of a graph in the coded model. For every node: its
+    bandwidth, rank, the blocks received during this time step
+    (added to the rank by commit_coded_buffer), and its utilizations.
+    In the exact model, also the space spanned by its blocks including
+    the ones received during this time step, and the rows it can send
+    combinations of (as of the start of the time step).
+    """
+
+    def __init__(self, G, k, model="exact", seed=None):
+        """
+        G: Topology, as built by `make_graph`. Every node starts with
+           the pieces it has (in the exact model, its pieces below k,
+           as unit vectors; otherwise, a rank of the number of its
+           pieces, capped at k).
+        k: The number of pieces the data is encoded from.
+        model: How to tell how many blocks are useful, one of MODELS
+               (see above).
+        seed: Seeds the random coefficients of the exact model.
+        """
+        if model not in MODELS:
+            raise ValueError("Unknown coded model: {}".format(model))
+
+        self.k = k
+        self.model = model
+        self.links = [{n: link.weight for n, link in links.items()} for links in G.links]
+        self.bw = np.array([state.bw for state in G.states], dtype=np.int64)
+        self.buffer = np.zeros(len(G), dtype=np.int64)
+        self.send_util = np.zeros(len(G), dtype=np.int64)
+        self.rcv_util = np.zeros(len(G), dtype=np.int64)
+
+        if model == "exact":
+            self.rng = np.random.default_rng(seed)
+            self.spans = []
+            for state in G.states:
+                span = Subspace(k)
+                for piece in sorted(state.data):
+                    if 0 <= piece < k:
+                        unit = np.zeros(k, dtype=np.int64)
+                        unit[piece] = 1
+                        span.add(span.reduce(unit))
+                self.spans.append(span)
+            self.committed = [span.rows for span in self.spans]
+            self.rank = np.array([len(span) for span in self.spans], dtype=np.int64)
+        else:
+            self.rank = np.array(
+                [min(len(state.data), k) for state in G.states], dtype=np.int64
+            )
+
+    def __len__(self):
+        return len(self.links)
+
+    def combination(self, node):
+        """
+        Returns a random combination of the blocks `node` held at the
+        start of the time step (exact model only).
+        """
+        rows = self.committed[node]
+        coefficients = self.rng.integers(FIELD, size=len(rows))
+        return coefficients @ rows % FIELD
+
+
+def get_useful_blocks(swarm, sender, reciever):
+    """
+    Returns how many more blocks `sender` can send `reciever` this time
+    step that are independent of what `reciever` holds and has received.
+
+    In the exact model, this is an upper bound (as in the generic
+    model) if `sender` has any such block, and 0 otherwise.
+    """
+    rank = swarm.rank[sender]
+    held = swarm.rank[reciever] + swarm.buffer[reciever]
+    if swarm.model == "nested":
+        useful = rank - held
+    else:
+        useful = min(rank, swarm.k - held)
+
+    if swarm.model == "exact" and useful > 0:
+        reduced = swarm.spans[reciever].reduce(swarm.combination(sender))
+        if not reduced.any():
+            return 0
+    return max(int(useful), 0)
+
+
+def get_max_possible_coded_rate(swarm, sender, reciever):
+    """
+    Like get_max_possible_rate: the most blocks that can be sent over
+    the link from `sender` to `reciever` with the remaining bandwidth.
+    """
+    return min(
+        swarm.links[sender][reciever],
+        int(swarm.bw[sender] - swarm.send_util[sender]),
+        int(swarm.bw[reciever] - swarm.rcv_util[reciever]),
+    )
+
+
+def send_coded(swarm, sender, reciever, amount):
+    """
+    Sends up to `amount` blocks from `sender` to `reciever`, and returns
+    how many were sent. Ensures that the link and both bandwidths can
+    handle them, like `send`, and that they are all useful.
+
+    In the exact model, every block is a random combination of the
+    sender's blocks, and sending stops at the first one that would not
+    be useful, without using any bandwidth for it.
+    """
+    assert 0 <= amount <= get_max_possible_coded_rate(swarm, sender, reciever)
+
+    if swarm.model == "exact":
+        span = swarm.spans[reciever]
+        sent = 0
+        while sent < amount and span.add(span.reduce(swarm.combination(sender))):
+            sent += 1
+        amount = sent
+    else:
+        assert amount <= get_useful_blocks(swarm, sender, reciever)
+
+    swarm.buffer[reciever] += amount
+    swarm.rcv_util[reciever] += amount
+    swarm.send_util[sender] += amount
+    return amount
+
+
+def relax_coded_equal(swarm, node):
+    """
+    The coded counterpart of relax_send_equal: `node` shares its
+    bandwidth equally between the neighbors it can send useful blocks.
+    """
+    targets = [n for n in swarm.links[node] if get_useful_blocks(swarm, node, n)]
+    if not targets:
+        return
+
+    target_bw = math.ceil(swarm.bw[node] / len(targets))
+    for n in targets:
+        amount = min(
+            target_bw,
+            get_max_possible_coded_rate(swarm, node, n),
+            get_useful_blocks(swarm, node, n),
+        )
+        if amount > 0:
+            send_coded(swarm, node, n, amount)
+
+
+def relax_coded_greedy(swarm, node):
+    """
+    The coded counterpart of relax_send_greedy: `node` sends as much as
+    it can to the neighbors it can reach at the best rates first.
+    """
+    outgoing_caps = [
+        (n, get_max_possible_coded_rate(swarm, node, n)) for n in swarm.links[node]
+    ]
+    outgoing_caps.sort(key=lambda x: -x[1])
+
+    for n, rate in outgoing_caps:
+        remaining_outgoing_cap = int(swarm.bw[node] - swarm.send_util[node])
+        if remaining_outgoing_cap == 0:
+            break
+
+        amount = min(
+            remaining_outgoing_cap,
+            get_max_possible_coded_rate(swarm, node, n),
+            get_useful_blocks(swarm, node, n),
+        )
+        if amount > 0:
+            send_coded(swarm, node, n, amount)
+
+
+CODED_RELAXATIONS = {
+    "equal": relax_coded_equal,
+    "greedy": relax_coded_greedy,
+}
+
+
+def coded_completed(swarm):
+    return bool((swarm.rank >= swarm.k).all())
+
+
+def get_coded_util_percent(swarm):
+    """
+    Like get_util_percents: the data received this time step over the
+    most that could have been received.
+    """
+    possible = np.minimum(swarm.k - swarm.rank, swarm.bw).sum()
+    return swarm.rcv_util.sum() / possible if possible else 0
+
+
+def commit_coded_buffer(swarm):
+    swarm.rank += swarm.buffer
+    if swarm.model == "exact":
+        swarm.committed = [span.rows for span in swarm.spans]
+    swarm.buffer[:] = 0
+    swarm.send_util[:] = 0
+    swarm.rcv_util[:] = 0
+
+
+def run_coded_simulation(
+    G, k, relax, max_time=None, verbose=False, model="exact", seed=None
+):
+    """
+    Runs the simulation of G in the coded model until every node holds
+    k independent blocks, and returns the completion time.
+
+    G: Topology, as built by `make_graph` (it is not modified).
+    k: The number of pieces, like len(all_data).
+    relax: A coded relax method (see CODED_RELAXATIONS).
+    max_time: If given, gives up after this many time steps.
+    verbose: Print the utilization every time step.
+    model: How to tell how many blocks are useful, one of MODELS (see
+           above).
+    seed: Seeds the random coefficients of the exact model.
+    """
+    swarm = CodedSwarm(G, k, model, seed)
+
+    time = 0
+    while not coded_completed(swarm):
+        if max_time is not None and time >= max_time:
+            break
+
+        for node in range(len(swarm)):
+            relax(swarm, node)
+        time += 1
+
+        util = get_coded_util_percent(swarm)
+        logging.info(util)
+        if verbose:
+            print(util)
+
+        commit_coded_buffer(swarm)
+
+    return time
@@ -0,0 +1,530 @@
+"""
+Methods for emulating a swarm on localhost with real bytes, to check
+the simulation's predictions.
+
+Every node of the graph becomes a peer process with its data in a
+memory-mapped file and a listening socket on 127.0.0.1. The peers run
+freely, like BitTorrent clients, without time steps: every peer tells
+its neighbors which pieces it has, requests the pieces it is missing
+from the neighbors that have them, and announces every piece as soon
+as it arrives, so it can be forwarded right away. The coordinator (the
+calling process) only starts the swarm and waits for every peer to
+hold all the data.
+
+A peer's sends are shaped by a token bucket for its bandwidth and one
+per outgoing link for the link's capacity, and its receives by a token
+bucket for its bandwidth, where a rate of 1 is one piece per
+`tick_seconds`. A peer keeps about one time step's worth of requests
+outstanding on every incoming link. Pieces are sent with os.sendfile
+straight from the sender's file and received with recv_into straight
+into the receiver's mapping, so the peers themselves are never the
+bottleneck.
+
+Comparing the measured completion time with the simulated one shows
+what the time step model gets wrong, e.g. taking a whole time step per
+hop, or only forwarding data once the time step is over.
+"""
+
+import copy
+import logging
+import mmap
+import os
+import queue
+import random
+import socket
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+from .simulation import run_simulation
+
+# Every message is a kind and a piece id (or, for HELLO, a node). A
+# PIECE message is followed by the piece's bytes.
+HEADER = struct.Struct("!BQ")
+HELLO = 0
+HAVE = 1
+REQUEST = 2
+PIECE = 3
+
+# Seconds to wait for a peer to exit after asking it to stop, before
+# terminating it.
+STOP_TIMEOUT = 5
+
+# By default, run_emulation gives up once the swarm has taken this many
+# times the predicted completion time (plus STOP_TIMEOUT seconds).
+TIMEOUT_FACTOR = 10
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, refilled at `rate` tokens per second
+    up to `burst` tokens.
+
+    consume() takes the tokens right away, letting the bucket go into
+    debt, and sleeps until the debt would have been refilled. Callers
+    are therefore served in order without polling.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= amount
+            debt = -self.tokens
+
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+
+def piece_bytes(piece, piece_size):
+    """
+    Returns the content of `piece`: its id, repeated.
+    """
+    pattern = piece.to_bytes(8, "big")
+    return (pattern * (piece_size // len(pattern) + 1))[:piece_size]
+
+
+def _recv_exactly(sock, view):
+    """
+    Fills the memoryview `view` from sock. Returns False if the
+    connection was closed.
+    """
+    while len(view):
+        n = sock.recv_into(view)
+        if n == 0:
+            return False
+        view = view[n:]
+    return True
+
+
+class _Peer:
+    """
+    The state of a peer process, shared by its threads. Every
+    connection to a neighbor has a reader thread, an uploader thread
+    that shapes the requested pieces, and a writer thread that sends
+    every message in order, so no thread ever blocks on a socket while
+    holding the lock.
+    """
+
+    def __init__(
+        self,
+        node,
+        path,
+        num_pieces,
+        pieces,
+        bw,
+        links,
+        windows,
+        piece_size,
+        tick_seconds,
+        seed,
+    ):
+        self.node = node
+        self.num_pieces = num_pieces
+        self.piece_size = piece_size
+        self.windows = windows
+
+        size = max(num_pieces, 1) * piece_size
+        self.file = open(path, "w+b")
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+        for piece in pieces:
+            self.mm[piece * piece_size : (piece + 1) * piece_size] = piece_bytes(
+                piece, piece_size
+            )
+
+        rate = piece_size / tick_seconds
+        self.send_bucket = TokenBucket(bw * rate, piece_size)
+        self.recv_bucket = TokenBucket(bw * rate, piece_size)
+        self.link_buckets = {
+            n: TokenBucket(weight * rate, piece_size)
+            for n, weight in links.items()
+            if weight > 0
+        }
+
+        self.lock = threading.Lock()
+        self.held = set(pieces)
+        # Pieces requested from some neighbor and not received yet, and
+        # the pieces requested from every neighbor.
+        self.requested = set()
+        self.outstanding = {}
+        # The pieces every neighbor has announced.
+        self.has = {}
+        self.outboxes = {}
+        self.uploads = {}
+        self.sockets = []
+        self.rng = random.Random(seed)
+        self.complete = threading.Event()
+        if len(self.held) == num_pieces:
+            self.complete.set()
+
+    def attach(self, n, sock):
+        """
+        Starts talking to neighbor n over sock.
+        """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        outbox = queue.Queue()
+        uploads = queue.Queue()
+        with self.lock:
+            self.sockets.append(sock)
+            self.outstanding[n] = set()
+            self.has[n] = set()
+            self.outboxes[n] = outbox
+            self.uploads[n] = uploads
+            for piece in self.held:
+                outbox.put((HAVE, piece))
+
+        for target in (self._read, self._upload, self._write):
+            threading.Thread(target=target, args=(n, sock), daemon=True).start()
+
+    def _request_more(self, n):
+        """
+        Requests pieces from n until its window is full. Must be called
+        with the lock held.
+        """
+        free = self.windows.get(n, 0) - len(self.outstanding[n])
+        if free <= 0:
+            return
+        candidates = list(self.has[n] - self.held - self.requested)
+        for piece in self.rng.sample(candidates, min(free, len(candidates))):
+            self.requested.add(piece)
+            self.outstanding[n].add(piece)
+            self.outboxes[n].put((REQUEST, piece))
+
+    def _read(self, n, sock):
+        header = bytearray(HEADER.size)
+        try:
+            while _recv_exactly(sock, memoryview(header)):
+                kind, piece = HEADER.unpack(header)
+
+                if kind == HAVE:
+                    with self.lock:
+                        self.has[n].add(piece)
+                        self._request_more(n)
+
+                elif kind == REQUEST:
+                    self.uploads[n].put(piece)
+
+                elif kind == PIECE:
+                    self.recv_bucket.consume(self.piece_size)
+                    start = piece * self.piece_size
+                    view = memoryview(self.mm)[start : start + self.piece_size]
+                    try:
+                        if not _recv_exactly(sock, view):
+                            break
+                    finally:
+                        view.release()
+                    self._received(n, piece)
+        except OSError:
+            pass
+
+        # n is gone: ask the other neighbors for what it still owed.
+        with self.lock:
+            self.requested -= self.outstanding[n]
+            self.outstanding[n] = set()
+            self.has[n] = set()
+            self.windows[n] = 0
+            for m in self.outstanding:
+                self._request_more(m)
+        self.uploads[n].put(None)
+        self.outboxes[n].put(None)
+
+    def _received(self, n, piece):
+        with self.lock:
+            self.outstanding[n].discard(piece)
+            self.requested.discard(piece)
+            if piece not in self.held:
+                self.held.add(piece)
+                for outbox in self.outboxes.values():
+                    outbox.put((HAVE, piece))
+                if len(self.held) == self.num_pieces:
+                    self.complete.set()
+            self._request_more(n)
+
+    def _upload(self, n, sock):
+        link_bucket = self.link_buckets.get(n)
+        while True:
+            piece = self.uploads[n].get()
+            if piece is None or link_bucket is None:
+                return
+            self.send_bucket.consume(self.piece_size)
+            link_bucket.consume(self.piece_size)
+            self.outboxes[n].put((PIECE, piece))
+
+    def _write(self, n, sock):
+        outbox = self.outboxes[n]
+        try:
+            while True:
+                message = outbox.get()
+                if message is None:
+                    return
+                kind, piece = message
+                sock.sendall(HEADER.pack(kind, piece))
+                if kind == PIECE:
+                    offset = piece * self.piece_size
+                    remaining = self.piece_size
+                    while remaining:
+                        sent = os.sendfile(
+                            sock.fileno(), self.file.fileno(), offset, remaining
+                        )
+                        offset += sent
+                        remaining -= sent
+        except OSError:
+            return
+
+    def verify(self):
+        """
+        Returns whether every piece the peer holds has the right content.
+        """
+        with self.lock:
+            held = list(self.held)
+        return all(
+            self.mm[piece * self.piece_size : (piece + 1) * self.piece_size]
+            == piece_bytes(piece, self.piece_size)
+            for piece in held
+        )
+
+    def close(self):
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def _accept(server, peer):
+    header = bytearray(HEADER.size)
+    while True:
+        try:
+            sock, _ = server.accept()
+            if not _recv_exactly(sock, memoryview(header)):
+                sock.close()
+                continue
+        except OSError:
+            return
+        kind, n = HEADER.unpack(header)
+        peer.attach(n, sock)
+
+
+def _report_complete(conn, peer):
+    peer.complete.wait()
+    conn.send(("complete",))
+
+
+def _peer_main(
+    conn,
+    node,
+    path,
+    num_pieces,
+    pieces,
+    bw,
+    links,
+    windows,
+    piece_size,
+    tick_seconds,
+    seed,
+):
+    """
+    The main method of a peer process. Talks to the coordinator over
+    the pipe `conn` (see run_emulation for the messages).
+    """
+    peer = _Peer(
+        node,
+        path,
+        num_pieces,
+        pieces,
+        bw,
+        links,
+        windows,
+        piece_size,
+        tick_seconds,
+        seed,
+    )
+    server = socket.create_server(("127.0.0.1", 0))
+    threading.Thread(target=_accept, args=(server, peer), daemon=True).start()
+    conn.send(("ready", server.getsockname()[1]))
+
+    try:
+        while True:
+            message = conn.recv()
+
+            if message[0] == "peers":
+                # Every pair of neighbors shares one connection, opened
+                # by the lower numbered node.
+                for n, port in message[1].items():
+                    if n > node and (n in links or n in windows):
+                        sock = socket.create_connection(("127.0.0.1", port))
+                        sock.sendall(HEADER.pack(HELLO, node))
+                        peer.attach(n, sock)
+                threading.Thread(
+                    target=_report_complete, args=(conn, peer), daemon=True
+                ).start()
+
+            elif message[0] == "verify":
+                conn.send(("verified", peer.verify(), len(peer.held)))
+
+            elif message[0] == "stop":
+                break
+    except EOFError:
+        # The coordinator is gone.
+        pass
+
+    server.close()
+    peer.close()
+    peer.mm.close()
+    peer.file.close()
+
+
+def run_emulation(
+    G,
+    all_data,
+    relax,
+    piece_size=64 * 1024,
+    tick_seconds=0.1,
+    seed=None,
+    max_time=None,
+    timeout=None,
+):
+    """
+    Runs the simulation on G with `relax`, and a swarm of local peer
+    processes exchanging real pieces of `piece_size` bytes under the
+    bandwidths and link capacities of G. Returns (predicted completion
+    time, measured completion time, measured completion time of every
+    node). Times are in time steps: measured times are wall-clock times
+    divided by `tick_seconds`.
+
+    max_time: If given, the simulation gives up after this many time
+              steps (see run_simulation).
+    timeout: Seconds to wait for the swarm to complete. By default,
+             TIMEOUT_FACTOR times the predicted time plus STOP_TIMEOUT.
+
+    Data must be integers in 0...len(all_data)-1. Raises RuntimeError
+    if some peer dies, the swarm does not complete within the timeout,
+    or some peer ends up with missing or corrupted pieces.
+    """
+    predicted = run_simulation(
+        copy.deepcopy(G), all_data, relax, max_time=max_time, trusted=True, seed=seed
+    )
+    if timeout is None:
+        timeout = TIMEOUT_FACTOR * predicted * tick_seconds + STOP_TIMEOUT
+
+    num_pieces = len(all_data)
+    seeds = random.Random(seed).sample(range(2 ** 32), len(G))
+    tempdir = tempfile.TemporaryDirectory()
+    peers = []
+    for node in G.nodes:
+        state = G.states[node]
+        conn, peer_conn = Pipe()
+        links = {n: link.weight for n, link in G.links[node].items()}
+        # About one time step's worth of requests on every incoming link.
+        windows = {
+            n: G.links[n][node].weight + 1
+            for n in G.nodes
+            if n != node and node in G.links[n] and G.links[n][node].weight > 0
+        }
+        p = Process(
+            target=_peer_main,
+            args=(
+                peer_conn,
+                node,
+                os.path.join(tempdir.name, "{}.dat".format(node)),
+                num_pieces,
+                sorted(state.data),
+                state.bw,
+                links,
+                windows,
+                piece_size,
+                tick_seconds,
+                seeds[node],
+            ),
+            daemon=True,
+        )
+        p.start()
+        peers.append((p, conn))
+
+    try:
+        ports = {
+            node: _receive_from(p, conn, node, timeout)[1]
+            for node, (p, conn) in enumerate(peers)
+        }
+
+        start = time.monotonic()
+        for p, conn in peers:
+            conn.send(("peers", ports))
+
+        finished = {}
+        pending = {conn: node for node, (p, conn) in enumerate(peers)}
+        while pending:
+            remaining = start + timeout - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(
+                    "Peers {} did not complete within {:.1f}s".format(
+                        sorted(pending.values()), timeout
+                    )
+                )
+            for conn in wait(list(pending), min(remaining, 1)):
+                node = pending.pop(conn)
+                _receive_from(peers[node][0], conn, node, timeout)
+                finished[node] = (time.monotonic() - start) / tick_seconds
+                logging.info(
+                    "peer {} completed at {:.2f} time steps".format(
+                        node, finished[node]
+                    )
+                )
+            for conn, node in pending.items():
+                if not peers[node][0].is_alive():
+                    raise RuntimeError("Peer {} died".format(node))
+
+        measured = max(finished.values())
+
+        for p, conn in peers:
+            conn.send(("verify",))
+        for node, (p, conn) in enumerate(peers):
+            message = _receive_from(p, conn, node, timeout)
+            if not message[1] or message[2] != num_pieces:
+                raise RuntimeError(
+                    "Peer {} has missing or corrupted pieces".format(node)
+                )
+    finally:
+        # A peer may have died (which is likely why we are here), so
+        # errors from its pipe must not hide the original exception.
+        for p, conn in peers:
+            try:
+                conn.send(("stop",))
+            except (OSError, EOFError):
+                pass
+        for p, conn in peers:
+            p.join(STOP_TIMEOUT)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        tempdir.cleanup()
+
+    return predicted, measured, [finished[node] for node in G.nodes]
+
+
+def _receive_from(p, conn, node, timeout):
+    """
+    Returns the next message from a peer, or raises RuntimeError if the
+    peer dies or sends nothing for `timeout` seconds.
+    """
+    try:
+        if conn.poll(timeout):
+            return conn.recv()
+    except EOFError:
+        pass
+    if p.is_alive():
+        raise RuntimeError("Peer {} sent nothing for {:.1f}s".format(node, timeout))
+    raise RuntimeError("Peer {} died".format(node))
@@ -0,0 +1,132 @@
+"""
+Methods for fast-forwarding through the steady state of a simulation.
+
+In long runs, the middle of the simulation often has every node send
+and receive the same amount of data at every time step. Once
+run_simulation (with fast_forward=True) sees this for a few time steps
+in a row, skip_ahead works out for how many more time steps the senders
+have enough data to repeat the last time step's transfers, and applies
+all of them at once.
+"""
+
+from .utils import *
+
+# Number of time steps in a row with the same transfer rates before
+# skipping ahead.
+STABLE_TICKS = 3
+
+
+class SteadyState:
+    """
+    Watches the time steps of a simulation for a steady state: every
+    node sending and receiving the same amount of data for STABLE_TICKS
+    time steps in a row. Which links carry the data may change between
+    time steps, as relax methods spread the same bandwidth differently.
+    """
+
+    def __init__(self):
+        self.rates = None
+        self.pattern = None
+        self.received = None
+        self.stable = 0
+
+    def observe(self, G):
+        """
+        Should be called at the end of every time step, after the
+        transfers are applied and before reset_utils and commit_buffer.
+        """
+        rates = tuple((state.send_util, state.rcv_util) for state in G.states)
+        self.stable = self.stable + 1 if rates == self.rates else 1
+        self.rates = rates
+        self.pattern = transfer_pattern(G)
+        # Two senders may send a node the same data, so count what is
+        # new (as in get_util_percents).
+        self.received = {
+            node: len(state.buffer - state.data)
+            for node, state in enumerate(G.states)
+        }
+
+    def skip(self, G, max_ticks=None):
+        """
+        If in a steady state, repeats the last time step's transfers
+        with skip_ahead. Should be called after commit_buffer. Returns
+        the number of time steps skipped.
+        """
+        if self.stable < STABLE_TICKS:
+            return 0
+        self.stable = 0
+        return skip_ahead(G, self.pattern, self.received, max_ticks)
+
+
+def transfer_pattern(G):
+    """
+    Returns the amount of data sent along every link during this time
+    step, as a sorted tuple of (sender, reciever, amount). Needs the
+    trusted mode, and must be called before reset_utils.
+    """
+    amounts = {}
+    for sender, reciever, data in G.graph["transfers"]:
+        if data:
+            link = (sender, reciever)
+            amounts[link] = amounts.get(link, 0) + len(data)
+    return tuple(sorted((s, r, amount) for (s, r), amount in amounts.items()))
+
+
+def skip_ahead(G, pattern, received, max_ticks=None):
+    """
+    Repeats the transfer pattern (see transfer_pattern) for as many time
+    steps as the senders have data for, and returns how many time steps
+    it skipped (at most max_ticks, if given). `received` maps every
+    receiver to the amount of new data it got per time step, which can
+    be less than the pattern sends it when senders send the same data.
+    Must be called between time steps, after commit_buffer.
+
+    Only the data the nodes have now is used, not the data they would
+    receive during the skipped time steps. Every link carries at most
+    its amount of the pattern for every skipped time step, of data its
+    own sender has and its receiver is missing, and every receiver gets
+    its amount of new data for every skipped time step. So it skips as
+    many time steps as every link's sender, and every receiver's
+    senders together, have the data for.
+
+    The data moved is chosen with sample_data, like the relax methods
+    do, but the result is not the same as running the time steps one by
+    one with the same seed, and relax methods that keep their own state
+    (like relax_choking or relax_schedule) would not see the skipped
+    time steps, so run_simulation refuses to fast-forward them.
+    """
+    states = G.states
+
+    senders = {}
+    for s, r, amount in pattern:
+        senders.setdefault(r, []).append((s, amount))
+    if not senders:
+        return 0
+
+    missing = {(s, r): states[s].data - states[r].data for s, r, amount in pattern}
+    ticks = min(len(missing[s, r]) // amount for s, r, amount in pattern)
+    for r, links in senders.items():
+        if received[r]:
+            supply = set().union(*(missing[s, r] for s, amount in links))
+            ticks = min(ticks, len(supply) // received[r])
+    if max_ticks is not None:
+        ticks = min(ticks, max_ticks)
+    if ticks <= 0:
+        return 0
+
+    received_by = {}
+    for r, links in senders.items():
+        # The senders with the least to offer choose first, so that the
+        # others can still make up the rest with different data.
+        links = sorted(links, key=lambda link: len(missing[link[0], r]))
+        wanted = received[r] * ticks
+        new = set()
+        for s, amount in links:
+            k = min(amount * ticks, wanted - len(new))
+            new |= sample_data(G, s, r, missing[s, r] - new, k)
+        received_by[r] = new
+
+    for r, new in received_by.items():
+        states[r].data |= new
+
+    return ticks
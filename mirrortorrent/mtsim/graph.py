@@ -2,9 +2,9 @@
 Methods for building graph topologies for the simulation
 """
 
-import networkx as nx
 import math
 import random
+from .topology import Topology
 
 def make_graph(num_nodes, all_data, bandwidths, edges):
     """
@@ -16,28 +16,15 @@ def make_graph(num_nodes, all_data, bandwidths, edges):
            that are lists of size num_nodes, containing the
            link capacities from key->index. 
            Note that edges[x][x] is always ignored. 
+
+    Returns a Topology (see topology.py), which can be converted to
+    a NetworkX graph with G.to_networkx() for drawing.
     """
     assert len(bandwidths) == num_nodes
     assert len(edges) == num_nodes
 
-    G = nx.DiGraph()
-    for i in range(num_nodes):
-        for j in range(num_nodes):
-            if i != j:
-                G.add_edge(i, j, weight=edges[i][j])
-
+    G = Topology(bandwidths, edges)
     G.nodes[0]["data"] = all_data
-    G.nodes[0]["buffer"] = set()
-    G.nodes[0]["bw"] = bandwidths[0]
-    G.nodes[0]["send_util"] = 0
-    G.nodes[0]["rcv_util"] = 0
-
-    for i in range(1, len(G.nodes)):
-        G.nodes[i]["data"] = set()
-        G.nodes[i]["buffer"] = set()
-        G.nodes[i]["bw"] = bandwidths[i]
-        G.nodes[i]["send_util"] = 0
-        G.nodes[i]["rcv_util"] = 0
 
     return G
 
@@ -77,6 +64,40 @@ def make_highlow_graph(
     return make_graph(num_high_bw_nodes + num_low_bw_nodes, all_data, bandwidths, edges)
 
 
+def make_trace_graph(all_data, rates, unit_rate):
+    """
+    Creates a graph calibrated from measured transfer rates, e.g. the
+    average rate column of the csvs in scripts/parsed_outputs.
+
+    rates: A list of measured rates, one per node.
+    unit_rate: The rate that corresponds to sending one unit of data
+               per time step. Every node gets a bandwidth of at least 1.
+
+    The link capacity between two nodes is the smaller of their
+    bandwidths.
+    """
+    bandwidths = [max(1, int(round(rate / unit_rate))) for rate in rates]
+
+    edges = {}
+    for i in range(len(rates)):
+        edges[i] = [min(bandwidths[i], bandwidths[j]) for j in range(len(rates))]
+
+    return make_graph(len(rates), all_data, bandwidths, edges)
+
+
+def place_data(G, placement):
+    """
+    Replaces the initial data in the graph (by default, everything
+    on node 0) with `placement`, a map from node -> set of data.
+    Nodes missing from the map start with no data.
+    """
+    for node in G.nodes:
+        G.nodes[node]["data"] = set(placement.get(node, ()))
+        G.nodes[node]["buffer"] = set()
+
+    return G
+
+
 def MAKE_X_GRAPH():
     """
     To create a new topology, write a method here that takes in arguments and
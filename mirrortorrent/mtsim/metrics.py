@@ -0,0 +1,207 @@
+"""
+Per-node and per-link utilization time series for the simulation
+"""
+
+import numpy as np
+from prettytable import PrettyTable
+
+# Why a node had idle send capacity at a time step.
+SEND_BUSY = 0  # No idle send capacity.
+SEND_NO_DATA = 1  # Nothing it has is missing anywhere.
+SEND_RECEIVERS_SATURATED = 2  # Every node missing its data is receive-saturated.
+SEND_OTHER = 3  # Link capacities or the relax method.
+SEND_REASONS = ("busy", "no suppliable data", "receivers saturated", "other")
+
+# Why a node had idle receive capacity at a time step.
+RECV_BUSY = 0  # No idle receive capacity, or nothing left to receive.
+RECV_NO_SUPPLIER = 1  # Nobody has what it is missing.
+RECV_SUPPLIERS_SATURATED = 2  # Everybody who has it is send-saturated.
+RECV_OTHER = 3  # Link capacities or the relax method.
+RECV_REASONS = ("busy", "no supplier", "suppliers saturated", "other")
+
+
+class Metrics:
+    """
+    Records, at every time step, the send and receive utilization of
+    every node, the usage of every link, why nodes left capacity idle,
+    and the utilization of the whole graph (like get_util_percents).
+
+    Everything is kept in NumPy ring buffers allocated up front, holding
+    the last `capacity` time steps. Pass the Metrics to run_simulation,
+    which calls `record` at the end of every time step.
+
+    The idle reasons are computed from a nodes x data matrix of which
+    node has which data, and count holders over the whole graph, so they
+    are exact for the fully connected graphs built by make_graph. Data
+    must be the integers 0...len(all_data)-1.
+
+    The total usage of every link is always kept. Set `record_links` to
+    also keep the usage of every link at every time step, which takes
+    capacity x nodes x nodes ints.
+    """
+
+    def __init__(self, G, all_data, capacity=1024, record_links=False):
+        """
+        G must already hold its initial data.
+        """
+        num_nodes = len(G)
+        num_data = len(all_data)
+
+        self.capacity = capacity
+        self.ticks = 0
+
+        self.bw = np.array([state.bw for state in G.states], dtype=np.int64)
+        self.weight = np.zeros((num_nodes, num_nodes), dtype=np.int64)
+        for node, links in enumerate(G.links):
+            for n, link in links.items():
+                self.weight[node, n] = link.weight
+
+        self.have = np.zeros((num_nodes, num_data), dtype=bool)
+        for node, state in enumerate(G.states):
+            self._add_data(node, state.data)
+
+        self.util = np.zeros(capacity, dtype=np.float64)
+        self.send_util = np.zeros((capacity, num_nodes), dtype=np.float32)
+        self.rcv_util = np.zeros((capacity, num_nodes), dtype=np.float32)
+        self.send_reason = np.zeros((capacity, num_nodes), dtype=np.int8)
+        self.recv_reason = np.zeros((capacity, num_nodes), dtype=np.int8)
+        self.link_total = np.zeros((num_nodes, num_nodes), dtype=np.int64)
+        self.links = None
+        if record_links:
+            self.links = np.zeros((capacity, num_nodes, num_nodes), dtype=np.int32)
+
+    def _add_data(self, node, data):
+        if data:
+            self.have[node, np.fromiter(data, dtype=np.int64, count=len(data))] = True
+
+    def record(self, G):
+        """
+        Should be called at the end of a time step, after the transfers
+        are applied (in trusted mode, which the link usage needs) and
+        before reset_utils and commit_buffer.
+        """
+        states = G.states
+        num_nodes = len(states)
+        i = self.ticks % self.capacity
+
+        send = np.fromiter((s.send_util for s in states), np.int64, num_nodes)
+        rcv = np.fromiter((s.rcv_util for s in states), np.int64, num_nodes)
+        self.send_util[i] = send / self.bw
+        self.rcv_util[i] = rcv / self.bw
+
+        used = np.zeros((num_nodes, num_nodes), dtype=np.int64)
+        transfers = G.graph.get("transfers")
+        if transfers:
+            senders, recievers, sizes = zip(
+                *((s, r, len(data)) for s, r, data in transfers)
+            )
+            np.add.at(used, (senders, recievers), sizes)
+        self.link_total += used
+        if self.links is not None:
+            self.links[i] = used
+
+        # Everything below is as of the start of the time step: the data
+        # received during it is still in the buffers.
+        have = self.have
+        missing = ~have
+        holders = have.sum(axis=0)
+
+        send_idle = send < self.bw
+        rcv_idle = rcv < self.bw
+
+        # Data that some node is missing, and that some node with idle
+        # receive capacity is missing.
+        missing_somewhere = holders < num_nodes
+        missing_at_open = (missing & rcv_idle[:, None]).any(axis=0)
+        has_suppliable = (have & missing_somewhere).any(axis=1)
+        reaches_open = (have & missing_at_open).any(axis=1)
+
+        self.send_reason[i] = np.select(
+            [~send_idle, ~has_suppliable, ~reaches_open],
+            [SEND_BUSY, SEND_NO_DATA, SEND_RECEIVERS_SATURATED],
+            SEND_OTHER,
+        )
+
+        # Data that somebody has, and that somebody with idle send
+        # capacity has.
+        num_missing = missing.sum(axis=1)
+        held_by_free = (have & send_idle[:, None]).any(axis=0)
+        has_supplier = (missing & (holders > 0)).any(axis=1)
+        reaches_free = (missing & held_by_free).any(axis=1)
+
+        self.recv_reason[i] = np.select(
+            [~rcv_idle | (num_missing == 0), ~has_supplier, ~reaches_free],
+            [RECV_BUSY, RECV_NO_SUPPLIER, RECV_SUPPLIERS_SATURATED],
+            RECV_OTHER,
+        )
+
+        # Like get_util_percents, count the distinct new data received,
+        # since two senders may send a node the same piece.
+        received = sum(len(state.buffer - state.data) for state in states)
+        possible = np.minimum(num_missing, self.bw).sum()
+        self.util[i] = received / possible if possible else 0
+
+        for node, state in enumerate(states):
+            self._add_data(node, state.buffer)
+
+        self.ticks += 1
+
+    def series(self, name):
+        """
+        Returns the recorded time series `name` (one of "util",
+        "send_util", "rcv_util", "send_reason", "recv_reason" or
+        "links"), oldest time step first.
+        """
+        buffer = getattr(self, name)
+        if self.ticks <= self.capacity:
+            return buffer[: self.ticks]
+
+        i = self.ticks % self.capacity
+        return np.concatenate((buffer[i:], buffer[:i]))
+
+    def link_utilization(self):
+        """
+        Returns a nodes x nodes matrix of the mean usage of every link
+        over the run, as a fraction of its capacity (0 where there
+        is no link).
+        """
+        capacity = self.weight * max(self.ticks, 1)
+        return np.divide(
+            self.link_total,
+            capacity,
+            out=np.zeros(capacity.shape, dtype=np.float64),
+            where=capacity > 0,
+        )
+
+    def summary(self, top=10):
+        """
+        Returns a PrettyTable of the `top` nodes with the most time steps
+        of idle receive capacity, with their mean utilizations and how
+        often each idle reason applied, over the recorded time steps.
+        """
+        send_util = self.series("send_util")
+        rcv_util = self.series("rcv_util")
+        send_reason = self.series("send_reason")
+        recv_reason = self.series("recv_reason")
+
+        send_counts = [(send_reason == r).sum(axis=0) for r in range(4)]
+        recv_counts = [(recv_reason == r).sum(axis=0) for r in range(4)]
+        recv_idle = len(recv_reason) - recv_counts[RECV_BUSY]
+
+        t = PrettyTable(
+            ["Node", "Send util", "Recv util"]
+            + ["Send idle: " + r for r in SEND_REASONS[1:]]
+            + ["Recv idle: " + r for r in RECV_REASONS[1:]]
+        )
+        for node in np.argsort(-recv_idle, kind="stable")[:top]:
+            t.add_row(
+                [
+                    node,
+                    "{:.2f}".format(send_util[:, node].mean()),
+                    "{:.2f}".format(rcv_util[:, node].mean()),
+                ]
+                + [c[node] for c in send_counts[1:]]
+                + [c[node] for c in recv_counts[1:]]
+            )
+
+        return t
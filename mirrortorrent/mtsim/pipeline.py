@@ -0,0 +1,140 @@
+"""
+Methods for the pipelined (cut-through) transfer mode.
+
+Normally a piece received during a time step sits in the receiver's
+buffer until commit_buffer, so it takes at least one time step per hop.
+In the pipelined mode, relay_pass runs after the relax method every
+time step and lets nodes forward the pieces they just received with
+whatever bandwidth is left, like a streaming relay would.
+"""
+
+from collections import deque
+from .utils import *
+
+
+def relay(G, sender, reciever, data):
+    """
+    Like `send`, but for data in the sender's buffer (received this
+    time step) rather than its data. Ensures that the sender has the
+    data in its buffer, that the receiver has it in neither its data
+    nor its buffer, and that the link and both bandwidths can handle
+    it. Then adds it to the receiver's buffer and updates the utils.
+    """
+    sender_state = G.states[sender]
+    reciever_state = G.states[reciever]
+
+    assert data.issubset(sender_state.buffer)
+    assert data.isdisjoint(reciever_state.data)
+    assert data.isdisjoint(reciever_state.buffer)
+    assert len(data) <= G.links[sender][reciever].weight
+    assert len(data) + sender_state.send_util <= sender_state.bw
+    assert len(data) + reciever_state.rcv_util <= reciever_state.bw
+
+    reciever_state.buffer.update(data)
+    reciever_state.rcv_util += len(data)
+    sender_state.send_util += len(data)
+
+
+def transfer_order(G, transfers):
+    """
+    Returns the nodes of G in topological order of this time step's
+    transfers (a list of (sender, reciever, data)), so that a node comes
+    after every node it received data from. Nodes on a cycle of
+    transfers come last, in node order.
+    """
+    successors = {node: set() for node in G.nodes}
+    for sender, reciever, data in transfers:
+        if data:
+            successors[sender].add(reciever)
+
+    indegree = {node: 0 for node in G.nodes}
+    for node in successors:
+        for s in successors[node]:
+            indegree[s] += 1
+
+    ready = deque(node for node in G.nodes if indegree[node] == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for s in successors[node]:
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                ready.append(s)
+
+    seen = set(order)
+    order.extend(node for node in G.nodes if node not in seen)
+    return order
+
+
+def relay_pass(G):
+    """
+    Should be called after the relax method at every time step, in
+    place of apply_transfers (the pipelined mode needs the trusted
+    mode, see set_trusted).
+
+    Applies the queued transfers, then visits the nodes that received
+    data during this time step, starting in transfer_order, and has
+    each forward that data (and only that: data a node held before the
+    time step is up to the relax method) to the neighbors that are
+    missing it, fastest link first (like relax_send_greedy). A node
+    that is relayed data while it still has bandwidth left is queued to
+    be visited (again), so a piece can travel as many hops in a single
+    time step as the bandwidths and links allow. Each link carries at
+    most its capacity over the whole time step. The relayed transfers
+    are added to the queue of transfers.
+
+    Relays ignore which peers the relax method chose, so relax methods
+    that restrict their peers (like relax_choking) opt out of the
+    pipelined mode.
+    """
+    transfers = G.graph["transfers"]
+
+    link_used = {}
+    for sender, reciever, data in transfers:
+        link = (sender, reciever)
+        link_used[link] = link_used.get(link, 0) + len(data)
+
+    order = transfer_order(G, transfers)
+    apply_transfers(G)
+
+    def residual_rate(node, n):
+        residual_link = G.links[node][n].weight - link_used.get((node, n), 0)
+        return min(residual_link, get_max_possible_rate(G, node, n))
+
+    states = G.states
+    # commit_buffer never empties the buffers, so the data received
+    # during this time step is what is in a buffer but not in the data.
+    fresh = {node: states[node].buffer - states[node].data for node in order}
+    pending = deque(node for node in order if fresh[node])
+    queued = set(pending)
+    while pending:
+        node = pending.popleft()
+        queued.discard(node)
+        state = states[node]
+
+        outgoing = sorted(G.links[node], key=lambda n: -residual_rate(node, n))
+
+        for n in outgoing:
+            if state.send_util == state.bw:
+                break
+
+            rate = residual_rate(node, n)
+            if rate <= 0:
+                continue
+
+            neighbor_state = states[n]
+            relayable = fresh[node] - neighbor_state.data - neighbor_state.buffer
+            if not relayable:
+                continue
+
+            data = sample_data(G, node, n, relayable, rate)
+            relay(G, node, n, data)
+            transfers.append((node, n, data))
+            link_used[(node, n)] = link_used.get((node, n), 0) + len(data)
+            fresh[n] |= data
+
+            # Every relay adds data to a buffer, so this ends.
+            if n not in queued and neighbor_state.send_util < neighbor_state.bw:
+                pending.append(n)
+                queued.add(n)
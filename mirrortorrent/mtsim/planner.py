@@ -0,0 +1,193 @@
+"""
+Methods for choosing the initial data placement using the simulation.
+
+A placement assigns every bin (as returned by the do_binpack_X functions
+in scripts/distribute.py) to a node of the graph. Placements are
+represented as tuples of nodes, where placement[i] is the node that
+bin i is seeded on.
+"""
+
+import copy
+import math
+from multiprocessing import Pool
+import numpy as np
+
+from .graph import place_data
+from .relaxations import relax_send_greedy
+from .simulation import run_simulation
+from .utils import completed
+
+
+def bins_to_pieces(bins, piece_size):
+    """
+    Takes in a list of dictionaries mapping filenames to filesizes
+    (in bytes), as returned by the do_binpack_X functions.
+
+    Splits every bin into pieces of `piece_size` bytes (every
+    non-empty bin gets at least one piece). Returns a list of sets
+    of piece ids, one per bin, and the set of all piece ids.
+    """
+    bin_pieces = []
+    counter = 0
+    for b in bins:
+        size = sum(b.values())
+        num_pieces = max(1, math.ceil(size / piece_size)) if b else 0
+        bin_pieces.append(set(range(counter, counter + num_pieces)))
+        counter += num_pieces
+
+    return bin_pieces, set(range(counter))
+
+
+def placement_data(placement, bin_pieces):
+    """
+    Returns a map from node -> set of data that the node starts
+    with under `placement`.
+    """
+    data = {}
+    for i, node in enumerate(placement):
+        data.setdefault(node, set()).update(bin_pieces[i])
+    return data
+
+
+def completion_lower_bound(G, all_data, data):
+    """
+    Returns a lower bound on the completion time when the nodes
+    start with `data` (a map from node -> set of data).
+
+    Every node has to receive everything it is missing through
+    its own bandwidth, and all the data received by the graph
+    has to be sent using the total bandwidth of the graph.
+    """
+    bound = 0
+    total_missing = 0
+    total_bw = 0
+    for node in G.nodes:
+        bw = G.nodes[node]["bw"]
+        missing = len(all_data) - len(data.get(node, ()))
+        bound = max(bound, math.ceil(missing / bw))
+        total_missing += missing
+        total_bw += bw
+
+    return max(bound, math.ceil(total_missing / total_bw))
+
+
+def evaluate_placement(args):
+    """
+    Simulates a single placement once per seed in `seeds` and returns
+    the mean completion time, or infinity if some trial did not
+    complete within max_time.
+
+    Takes a single tuple of arguments so that it can be used with
+    Pool.map.
+    """
+    G, all_data, data, relax, seeds, max_time, trusted = args
+
+    times = []
+    for seed in seeds:
+        H = place_data(copy.deepcopy(G), data)
+        time = run_simulation(
+            H, all_data, relax, max_time=max_time, trusted=trusted, seed=seed
+        )
+        if not completed(H, all_data):
+            return math.inf
+        times.append(time)
+
+    return sum(times) / len(times)
+
+
+def neighboring_placements(placement, nodes):
+    """
+    Returns all placements that differ from `placement` by moving
+    a single bin to a different node.
+    """
+    neighbors = []
+    for i, current in enumerate(placement):
+        for node in nodes:
+            if node != current:
+                neighbors.append(placement[:i] + (node,) + placement[i + 1 :])
+    return neighbors
+
+
+def plan_placement(
+    G,
+    bin_pieces,
+    all_data,
+    relax=relax_send_greedy,
+    initial=None,
+    trials=3,
+    max_time=None,
+    processes=None,
+    cache=None,
+    trusted=False,
+    seed=None,
+):
+    """
+    Searches for the placement of bins onto the nodes of G that
+    minimizes the simulated completion time.
+
+    Starting from `initial` (by default, bin i on node i, wrapping
+    around), repeatedly evaluates every placement that moves a single
+    bin to another node and moves to the best one, until no move
+    improves the completion time.
+
+    Placements whose completion_lower_bound is no better than the best
+    placement found so far are never simulated. The rest of a round is
+    simulated in parallel over `processes` worker processes. Results are
+    kept in `cache` (a map from placement -> completion time), which can
+    be passed in again to reuse results across calls. `trusted` runs
+    the simulations in trusted mode (see run_simulation).
+
+    `trials` seeds are spawned from `seed` with a SeedSequence, and
+    every placement is simulated with the same seeds, so placements are
+    compared under the same random choices and a search can be
+    reproduced from its seed.
+
+    Returns (best placement, its completion time, cache).
+    """
+    nodes = list(G.nodes)
+    if initial is None:
+        initial = tuple(nodes[i % len(nodes)] for i in range(len(bin_pieces)))
+    if cache is None:
+        cache = {}
+    seeds = np.random.SeedSequence(seed).spawn(trials)
+
+    with Pool(processes) as pool:
+
+        def evaluate(placements, best_time):
+            pending = []
+            for p in placements:
+                if p in cache:
+                    continue
+                data = placement_data(p, bin_pieces)
+                if completion_lower_bound(G, all_data, data) >= best_time:
+                    continue
+                pending.append(p)
+
+            args = [
+                (
+                    G,
+                    all_data,
+                    placement_data(p, bin_pieces),
+                    relax,
+                    seeds,
+                    max_time,
+                    trusted,
+                )
+                for p in pending
+            ]
+            for p, time in zip(pending, pool.map(evaluate_placement, args)):
+                cache[p] = time
+
+        evaluate([initial], math.inf)
+        best, best_time = initial, cache[initial]
+
+        while True:
+            candidates = neighboring_placements(best, nodes)
+            evaluate(candidates, best_time)
+
+            scored = [(cache[p], p) for p in candidates if p in cache]
+            if not scored or min(scored)[0] >= best_time:
+                break
+            best_time, best = min(scored)
+
+    return best, best_time, cache
@@ -0,0 +1,108 @@
+"""
+Timing counters for the simulation loop
+"""
+
+import cProfile
+import logging
+import pstats
+import time
+from prettytable import PrettyTable
+
+
+class Profiler:
+    """
+    Accumulates the time spent in each phase of the simulation.
+
+    Phases are named by strings: the tick loop records "relax" (with a
+    "relax:<name>" entry per relax method), "start_time_step",
+    "apply_transfers" (in trusted mode), "relay_pass" (in pipelined
+    mode), "metrics" (with a Metrics), "fast_forward" (with
+    fast_forward), "get_util_percents", "reset_utils", "commit_buffer"
+    and "completed", and `send` records "send" while the profiler is
+    attached to the graph (see run_simulation).
+
+    Times are taken with a monotonic clock (time.perf_counter) and only
+    the running totals and call counts are kept, so the overhead is a
+    couple of clock reads per phase.
+
+    If `cprofile` is set, the whole run is also profiled with cProfile,
+    and the stats can be printed or dumped for snakeviz and friends.
+    Every phase is a plain function call, so py-spy's flame graphs
+    show the same breakdown without this profiler.
+    """
+
+    def __init__(self, cprofile=False, clock=time.perf_counter):
+        self.clock = clock
+        self.totals = {}
+        self.calls = {}
+        self.ticks = 0
+        self.elapsed = 0
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self._start = None
+
+    def add(self, name, elapsed, calls=1):
+        """
+        Adds `elapsed` seconds spent over `calls` calls to phase `name`.
+        """
+        self.totals[name] = self.totals.get(name, 0) + elapsed
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def start(self):
+        """
+        Should be called when the run starts.
+        """
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        self._start = self.clock()
+
+    def stop(self):
+        """
+        Should be called when the run ends.
+        """
+        self.elapsed += self.clock() - self._start
+        if self.cprofile is not None:
+            self.cprofile.disable()
+
+    def summary(self):
+        """
+        Returns a PrettyTable with the calls, total and mean time of
+        every phase, and its share of the run.
+        """
+        t = PrettyTable(["Phase", "Calls", "Total (s)", "Mean (us)", "% of run"])
+
+        for name in sorted(self.totals, key=lambda n: -self.totals[n]):
+            total = self.totals[name]
+            calls = self.calls[name]
+            share = 100 * total / self.elapsed if self.elapsed else 0
+            t.add_row(
+                [
+                    name,
+                    calls,
+                    "{:.4f}".format(total),
+                    "{:.1f}".format(1e6 * total / calls),
+                    "{:.1f}".format(share),
+                ]
+            )
+
+        return t
+
+    def log_summary(self):
+        """
+        Logs (and prints) the summary table, followed by the cProfile
+        stats if enabled.
+        """
+        t = self.summary()
+        header = "{} time steps in {:.4f}s".format(self.ticks, self.elapsed)
+        logging.info(header)
+        logging.info(t)
+        print(header)
+        print(t)
+
+        if self.cprofile is not None:
+            pstats.Stats(self.cprofile).sort_stats("cumulative").print_stats(20)
+
+    def dump_stats(self, filename):
+        """
+        Writes the cProfile stats to `filename`.
+        """
+        self.cprofile.dump_stats(filename)
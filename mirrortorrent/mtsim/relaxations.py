@@ -4,7 +4,9 @@ Methods for choosing what data to transfer where.
 """
 
 import math
-import random
+import numpy as np
+from .choking import ChokingState
+from .schedules import schedule_for
 from .utils import *
 
 def relax_dummy(G, node, all_data):
@@ -40,11 +42,10 @@ def relax_send_equal(G, node, all_data):
         target_bw = math.ceil(bandwidth / len(suppliable_missing_data))
         max_possible = get_max_possible_rate(G, node, n)
         sendable_bw = min(target_bw, max_possible)
-        data_to_send = random.sample(
-            suppliable_missing_data[n],
-            min(sendable_bw, len(suppliable_missing_data[n])),
+        data_to_send = sample_data(
+            G, node, n, suppliable_missing_data[n], sendable_bw
         )
-        send(G, node, n, set(data_to_send))
+        send(G, node, n, data_to_send)
 
 
 def relax_fully_random(G, node, all_data):
@@ -62,16 +63,20 @@ def relax_fully_random(G, node, all_data):
     missing_data = get_missing_data(G, node, all_data)
     suppliable_missing_data = get_suppliable_missing_data(G, node, missing_data)
 
-    for n in suppliable_missing_data:
-        target_bw = random.randint(0, G.nodes[node]["bw"] - G.nodes[node]["send_util"])
+    # Draw a fraction for every neighbor at once. floor(fraction * (x + 1))
+    # is uniform over [0, x], like random.randint(0, x).
+    fractions = get_rng(G).random(len(suppliable_missing_data))
+
+    for n, fraction in zip(suppliable_missing_data, fractions):
+        remaining_bw = G.nodes[node]["bw"] - G.nodes[node]["send_util"]
+        target_bw = int(fraction * (remaining_bw + 1))
         max_possible = get_max_possible_rate(G, node, n)
 
         sendable_bw = min(target_bw, max_possible)
-        data_to_send = random.sample(
-            suppliable_missing_data[n],
-            min(sendable_bw, len(suppliable_missing_data[n])),
+        data_to_send = sample_data(
+            G, node, n, suppliable_missing_data[n], sendable_bw
         )
-        send(G, node, n, set(data_to_send))
+        send(G, node, n, data_to_send)
 
 
 def relax_send_greedy(G, node, all_data):
@@ -98,16 +103,109 @@ def relax_send_greedy(G, node, all_data):
             continue
 
         sendable_bw = min(remaining_outgoing_cap, rate)
-        data_to_send = random.sample(
-            suppliable_missing_data[n],
-            min(sendable_bw, len(suppliable_missing_data[n])),
+        data_to_send = sample_data(
+            G, node, n, suppliable_missing_data[n], sendable_bw
+        )
+
+        send(G, node, n, data_to_send)
+
+
+def relax_choking(G, node, all_data, **options):
+    """
+    A tit-for-tat relaxation, like a real BitTorrent client.
+
+    `node` only sends to the peers it has unchoked (see ChokingState):
+    the slots-1 peers it has recently downloaded from the fastest (or
+    uploaded to the fastest, once it has all the data), plus one
+    optimistic unchoke. It shares its bandwidth equally between them,
+    like relax_send_equal.
+
+    The choking state is kept in G.graph["choking"] and needs the time
+    step from run_simulation. To change the options of ChokingState, pass
+    functools.partial(relax_choking, slots=5, ...) as the relax method.
+    It cannot be run pipelined or fast-forwarded (see run_simulation).
+    """
+    state = G.graph.get("choking")
+    if state is None:
+        state = G.graph["choking"] = ChokingState(G, **options)
+    if state.time != G.graph["time"]:
+        state.update(G, all_data)
+
+    bandwidth = G.nodes[node]["bw"]
+
+    missing_data = {
+        n: all_data.difference(G.nodes[n]["data"])
+        for n in np.flatnonzero(state.current[node]).tolist()
+    }
+    suppliable_missing_data = get_suppliable_missing_data(G, node, missing_data)
+
+    for n in suppliable_missing_data:
+        target_bw = math.ceil(bandwidth / len(suppliable_missing_data))
+        max_possible = get_max_possible_rate(G, node, n)
+        sendable_bw = min(target_bw, max_possible)
+        data_to_send = sample_data(
+            G, node, n, suppliable_missing_data[n], sendable_bw
         )
+        send(G, node, n, data_to_send)
+        state.transferred[node, n] += len(data_to_send)
+
+
+# The choking state would not see the time steps skipped by fast_forward,
+# and relay_pass would relay to choked peers.
+relax_choking.fast_forward = False
+relax_choking.pipelined = False
 
-        send(G, node, n, set(data_to_send))
+
+def relax_schedule(G, node, all_data):
+    """
+    Replays a precomputed broadcast schedule (see mtsim.schedules).
+
+    On homogeneous graphs (like make_boring_graph) where node 0 starts
+    with all the data, the schedule for the graph's parameters is built
+    once, cached on disk, and every node sends exactly what the schedule
+    says at every time step. On any other graph, or if the simulation
+    did not start at time step 0, this falls back to relax_send_greedy.
+
+    The schedule is kept in G.graph["schedule"] (None when falling back).
+    It cannot be run pipelined or fast-forwarded: the schedule does not
+    know about the data relayed within a time step or moved by the
+    skipped time steps, and would send it again.
+    """
+    if "schedule" not in G.graph:
+        G.graph["schedule"] = (
+            schedule_for(G, all_data) if G.graph["time"] == 0 else None
+        )
+    schedule = G.graph["schedule"]
+
+    if schedule is None:
+        relax_send_greedy(G, node, all_data)
+        return
+
+    for n, data in schedule.transfers(G.graph["time"], node):
+        send(G, node, n, data)
+
+
+relax_schedule.pipelined = False
+relax_schedule.fast_forward = False
 
 
 def RELAX_X_TEMPLATE(G, node, add_data):
     """
     To write more relax methods, make methods of this form.
+    Use get_rng(G) and sample_data for any randomness.
+
+    A relax method that cannot be run pipelined or fast-forwarded (see
+    run_simulation), e.g. because it keeps its own state across time
+    steps, should set RELAX_X_TEMPLATE.pipelined = False or
+    RELAX_X_TEMPLATE.fast_forward = False.
     """
     pass
+
+
+RELAXATIONS = {
+    "equal": relax_send_equal,
+    "random": relax_fully_random,
+    "greedy": relax_send_greedy,
+    "choking": relax_choking,
+    "schedule": relax_schedule,
+}
@@ -0,0 +1,266 @@
+"""
+A persistent store of simulation results, in SQLite.
+
+Every run is a row of the `runs` table: the graph generator and its
+parameters, the relax method, the seed, the completion time and a few
+summary numbers, with indexes on the parameter columns, so comparing
+relax methods over thousands of runs is a single query. The generator's
+own parameters vary with the generator, so they are also stored one per
+row in the `params` table, indexed on (key, value), so that finding the
+runs with e.g. link_cap=1 does not scan every run.
+
+Per time step traces (like the series of a Metrics) are stored in the
+`traces` table, one row per series, as the raw bytes of a NumPy array.
+
+The database is opened in WAL mode, so readers never block the writer,
+and results are written in batches of one transaction each, so parallel
+workers (each with its own ResultsStore on the same file) only take the
+write lock once per batch.
+"""
+
+import json
+import sqlite3
+import time
+import numpy as np
+from prettytable import PrettyTable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    generator TEXT NOT NULL,
+    params TEXT NOT NULL,
+    num_nodes INTEGER NOT NULL,
+    num_pieces INTEGER NOT NULL,
+    relax TEXT NOT NULL,
+    seed INTEGER,
+    completion_time INTEGER NOT NULL,
+    mean_util REAL
+);
+CREATE INDEX IF NOT EXISTS runs_params
+    ON runs (generator, num_nodes, num_pieces, params, relax);
+CREATE INDEX IF NOT EXISTS runs_relax ON runs (relax, completion_time);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    key TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_id, key)
+);
+CREATE INDEX IF NOT EXISTS params_value ON params (key, value, run_id);
+CREATE TABLE IF NOT EXISTS traces (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+# The Metrics series stored as traces of a run.
+METRICS_SERIES = ("util", "send_util", "rcv_util", "send_reason", "recv_reason")
+
+
+class ResultsStore:
+    """
+    Collects results with `add` and writes them every `batch_size`
+    runs, and on `flush` or `close`. Use it as a context manager to
+    flush and close it at the end.
+    """
+
+    def __init__(self, path, batch_size=100, timeout=60):
+        """
+        path: The SQLite database file (created if needed).
+        batch_size: Number of runs written per transaction.
+        timeout: Seconds to wait for another writer's lock.
+        """
+        self.batch_size = batch_size
+        self.pending = []
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            backfill = not self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'params'"
+            ).fetchone()
+            self.db.executescript(SCHEMA)
+            if backfill:
+                # A store written before the params table existed.
+                self.db.execute(
+                    "INSERT INTO params SELECT runs.id, key, value"
+                    " FROM runs, json_each(runs.params)"
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(
+        self,
+        generator,
+        params,
+        num_nodes,
+        num_pieces,
+        relax,
+        completion_time,
+        seed=None,
+        metrics=None,
+        traces=None,
+    ):
+        """
+        Adds the result of a run.
+
+        generator: Name of the graph generator, e.g. "boring".
+        params: A dict of the generator's other parameters (and any
+                options of the run), stored as canonical JSON so that
+                equal parameters compare equal.
+        relax: Name of the relax method, e.g. "greedy".
+        metrics: If given, a Metrics whose series are stored as traces
+                 (see METRICS_SERIES) and whose mean utilization is
+                 stored with the run.
+        traces: A dict of other per time step NumPy arrays to store.
+        """
+        arrays = dict(traces or {})
+        mean_util = None
+        if metrics is not None:
+            for name in METRICS_SERIES:
+                arrays[name] = metrics.series(name)
+            mean_util = float(arrays["util"].mean()) if metrics.ticks else None
+
+        run = (
+            time.time(),
+            generator,
+            json.dumps(params, sort_keys=True),
+            num_nodes,
+            num_pieces,
+            relax,
+            seed,
+            completion_time,
+            mean_util,
+        )
+        self.pending.append((run, arrays))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending results in a single transaction.
+        """
+        if not self.pending:
+            return
+
+        with self.db:
+            for run, arrays in self.pending:
+                cursor = self.db.execute(
+                    "INSERT INTO runs (created, generator, params, num_nodes,"
+                    " num_pieces, relax, seed, completion_time, mean_util)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    run,
+                )
+                self.db.execute(
+                    "INSERT INTO params SELECT ?, key, value FROM json_each(?)",
+                    (cursor.lastrowid, run[2]),
+                )
+                self.db.executemany(
+                    "INSERT INTO traces VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (cursor.lastrowid,) + _encode(name, array)
+                        for name, array in arrays.items()
+                    ],
+                )
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def runs(self, **filters):
+        """
+        Returns the runs matching `filters` (column=value) as a list of
+        dicts, oldest first. `params` may be given as a dict, to match
+        the runs that have (at least) these parameter values, e.g.
+        params={"link_cap": 1}, or as the JSON of a run's parameters to
+        match them exactly.
+        """
+        where, values = _where(filters)
+        cursor = self.db.execute(
+            "SELECT * FROM runs{} ORDER BY id".format(where), values
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def traces(self, run_id):
+        """
+        Returns the traces of a run, as a dict of name -> NumPy array.
+        """
+        return {
+            name: np.frombuffer(data, dtype=dtype).reshape(json.loads(shape))
+            for name, dtype, shape, data in self.db.execute(
+                "SELECT name, dtype, shape, data FROM traces WHERE run_id = ?",
+                (run_id,),
+            )
+        }
+
+    def summary(self, **filters):
+        """
+        Returns a PrettyTable comparing the relax methods on every set
+        of parameters of the runs matching `filters` (see `runs`).
+        """
+        where, values = _where(filters)
+        t = PrettyTable(
+            ["Generator", "Params", "Nodes", "Pieces", "Relax", "Runs"]
+            + ["Mean time", "Min time", "Max time", "Mean util"]
+        )
+        for row in self.db.execute(
+            "SELECT generator, params, num_nodes, num_pieces, relax, COUNT(*),"
+            " AVG(completion_time), MIN(completion_time),"
+            " MAX(completion_time), AVG(mean_util) FROM runs{}"
+            " GROUP BY generator, num_nodes, num_pieces, params, relax"
+            " ORDER BY generator, num_nodes, num_pieces, params,"
+            " AVG(completion_time)".format(where),
+            values,
+        ):
+            row = list(row)
+            row[6] = "{:.2f}".format(row[6])
+            row[9] = "" if row[9] is None else "{:.2f}".format(row[9])
+            t.add_row(row)
+        return t
+
+
+def _encode(name, array):
+    array = np.ascontiguousarray(array)
+    return name, array.dtype.str, json.dumps(array.shape), array.tobytes()
+
+
+def _param_value(value):
+    """
+    Returns a parameter value as json_each stores it in the params table:
+    booleans as integers, and lists and dicts as compact JSON.
+    """
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, sort_keys=True, separators=(",", ":"))
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _where(filters):
+    filters = dict(filters)
+    params = {}
+    if isinstance(filters.get("params"), dict):
+        params = filters.pop("params")
+    for column in filters:
+        if not column.isidentifier():
+            raise ValueError("Bad column name: {}".format(column))
+    conditions = ["{} = ?".format(c) for c in filters]
+    values = list(filters.values())
+    for key, value in sorted(params.items()):
+        conditions.append(
+            "id IN (SELECT run_id FROM params WHERE key = ? AND value IS ?)"
+        )
+        values += [key, _param_value(value)]
+    if not conditions:
+        return "", ()
+    return " WHERE " + " AND ".join(conditions), tuple(values)
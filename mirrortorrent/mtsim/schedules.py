@@ -0,0 +1,239 @@
+"""
+Precomputed broadcast schedules for homogeneous graphs (see
+relax_schedule).
+
+When every node has the same bandwidth and every link the same
+capacity, as in make_boring_graph, a good schedule only depends on
+(nodes, pieces, bandwidth, link capacity). It is computed once with
+build_schedule, stored on disk, and replayed time step by time step.
+"""
+
+import os
+from collections import deque
+import numpy as np
+from .cache import CACHE_DIR
+
+# Bump when build_schedule changes, so that old cached schedules are
+# not replayed.
+SCHEDULE_VERSION = 1
+
+
+class Schedule:
+    """
+    A list of transfers (time step, sender, receiver, piece), sorted,
+    as NumPy arrays.
+    """
+
+    def __init__(self, num_nodes, ticks, senders, recievers, pieces):
+        self.num_nodes = num_nodes
+        self.ticks = ticks
+        self.senders = senders
+        self.recievers = recievers
+        self.pieces = pieces
+        self.keys = ticks.astype(np.int64) * num_nodes + senders
+
+    def __len__(self):
+        return int(self.ticks[-1]) + 1 if len(self.ticks) else 0
+
+    def transfers(self, time, sender):
+        """
+        Returns a list of (receiver, set of pieces) that `sender` sends
+        at time step `time`.
+        """
+        key = time * self.num_nodes + sender
+        lo = np.searchsorted(self.keys, key, side="left")
+        hi = np.searchsorted(self.keys, key, side="right")
+        if lo == hi:
+            return []
+
+        recievers = self.recievers[lo:hi]
+        pieces = self.pieces[lo:hi]
+        starts = np.flatnonzero(np.diff(recievers)) + 1
+        return [
+            (int(r[0]), set(p.tolist()))
+            for r, p in zip(np.split(recievers, starts), np.split(pieces, starts))
+        ]
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            num_nodes=self.num_nodes,
+            ticks=self.ticks,
+            senders=self.senders,
+            recievers=self.recievers,
+            pieces=self.pieces,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(
+                int(f["num_nodes"]), f["ticks"], f["senders"], f["recievers"], f["pieces"]
+            )
+
+
+def build_schedule(num_nodes, num_pieces, bw, link_cap):
+    """
+    Builds a broadcast schedule of num_pieces pieces from node 0 to all
+    the other nodes, where every node can send and receive bw pieces
+    and every link can carry link_cap pieces per time step.
+
+    Every time step, in this order:
+    1. Node 0 scatters the next pieces round robin over the other nodes
+       (piece p goes to relay 1 + p % (num_nodes - 1)).
+    2. Every relay forwards the pieces it was given to everyone else.
+    3. Every node with bandwidth left forwards any piece it has that
+       some node still misses (so few pieces spread by doubling, like a
+       binomial tree).
+
+    For many pieces, every node ends up sending and receiving about bw
+    pieces per time step (a striped pipeline), so the schedule finishes
+    in about num_pieces / bw time steps.
+
+    Returns a Schedule.
+    """
+    P = num_pieces
+    have = [set() for _ in range(num_nodes)]
+    have[0] = set(range(P))
+    num_missing = (num_nodes - 1) * P
+
+    # Pieces a relay still has to forward, and pieces that are neither
+    # only on node 0 nor everywhere.
+    to_forward = [[] for _ in range(num_nodes)]
+    in_flight = set()
+    holders = [1] * P
+    unscattered = deque(range(P) if num_nodes > 1 else ())
+    window = (num_nodes - 1) * max(link_cap, 1)
+
+    transfers = []
+    tick = 0
+    max_ticks = P * num_nodes + num_nodes
+
+    while num_missing and tick < max_ticks:
+        send_left = [bw] * num_nodes
+        recv_left = [bw] * num_nodes
+        link_used = {}
+        incoming = [set() for _ in range(num_nodes)]
+
+        def try_send(s, r, p):
+            if (
+                send_left[s] == 0
+                or recv_left[r] == 0
+                or link_used.get((s, r), 0) >= link_cap
+                or p in have[r]
+                or p in incoming[r]
+            ):
+                return False
+            send_left[s] -= 1
+            recv_left[r] -= 1
+            link_used[(s, r)] = link_used.get((s, r), 0) + 1
+            incoming[r].add(p)
+            transfers.append((tick, s, r, p))
+            return True
+
+        def forward(s, p):
+            # Offer p to every node that lacks it, starting at a rotating
+            # position so that receivers are spread out.
+            for i in range(num_nodes):
+                if send_left[s] == 0:
+                    return
+                r = (p + tick + i) % num_nodes
+                if r != s:
+                    try_send(s, r, p)
+
+        # 1. Scatter, skipping over pieces whose relay cannot take more
+        # this time step, but looking at most `window` pieces ahead.
+        skipped = []
+        while unscattered and send_left[0] and len(skipped) < window:
+            p = unscattered.popleft()
+            if not try_send(0, 1 + p % (num_nodes - 1), p):
+                skipped.append(p)
+        unscattered.extendleft(reversed(skipped))
+
+        # 2. Relays forward their own pieces.
+        for s in range(1, num_nodes):
+            for p in to_forward[s]:
+                if send_left[s] == 0:
+                    break
+                forward(s, p)
+
+        # 3. Everybody forwards what is still missing somewhere.
+        for s in range(num_nodes):
+            if send_left[s] == 0:
+                continue
+            for p in sorted(in_flight & have[s]):
+                if send_left[s] == 0:
+                    break
+                forward(s, p)
+
+        for r in range(num_nodes):
+            for p in sorted(incoming[r]):
+                have[r].add(p)
+                holders[p] += 1
+                num_missing -= 1
+                if holders[p] == num_nodes:
+                    in_flight.discard(p)
+                else:
+                    in_flight.add(p)
+                if r == 1 + p % (num_nodes - 1) and holders[p] == 2:
+                    to_forward[r].append(p)
+
+        for s in range(1, num_nodes):
+            to_forward[s] = [p for p in to_forward[s] if holders[p] < num_nodes]
+
+        tick += 1
+
+    transfers.sort()
+    arrays = np.array(transfers, dtype=np.int32).reshape(-1, 4).T
+    return Schedule(num_nodes, *arrays)
+
+
+def get_schedule(num_nodes, num_pieces, bw, link_cap, cache_dir=CACHE_DIR):
+    """
+    Returns the schedule for the parameters from the cache in
+    `cache_dir`, building and caching it if needed. Set the
+    MTSIM_CACHE_DIR environment variable to move the cache.
+    """
+    path = os.path.join(
+        cache_dir,
+        "schedule-v{}-{}-{}-{}-{}.npz".format(
+            SCHEDULE_VERSION, num_nodes, num_pieces, bw, link_cap
+        ),
+    )
+    if os.path.exists(path):
+        return Schedule.load(path)
+
+    schedule = build_schedule(num_nodes, num_pieces, bw, link_cap)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so that parallel runs never
+    # read a half-written schedule.
+    tmp_path = "{}.{}.tmp.npz".format(path[: -len(".npz")], os.getpid())
+    schedule.save(tmp_path)
+    os.replace(tmp_path, path)
+    return schedule
+
+
+def schedule_for(G, all_data):
+    """
+    Returns the schedule for G if G is homogeneous and in its initial
+    state (node 0 has all the data, the data is 0...len(all_data)-1,
+    the other nodes have nothing and every pair of nodes is linked),
+    or None otherwise.
+    """
+    states = G.states
+    num_nodes = len(states)
+    num_pieces = len(all_data)
+
+    bws = {state.bw for state in states}
+    weights = {link.weight for links in G.links for link in links.values()}
+    if len(bws) != 1 or len(weights) > 1:
+        return None
+    if any(len(links) != num_nodes - 1 for links in G.links):
+        return None
+    if all_data != set(range(num_pieces)) or states[0].data != all_data:
+        return None
+    if any(state.data for state in states[1:]):
+        return None
+
+    link_cap = weights.pop() if weights else 0
+    return get_schedule(num_nodes, num_pieces, bws.pop(), link_cap)
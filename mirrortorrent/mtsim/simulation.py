@@ -0,0 +1,209 @@
+"""
+Methods for running the simulation over a graph
+"""
+
+import logging
+import numpy as np
+from .fastforward import SteadyState
+from .pipeline import relay_pass
+from .utils import *
+
+
+def run_simulation(
+    G,
+    all_data,
+    relax,
+    max_time=None,
+    verbose=False,
+    profiler=None,
+    trusted=False,
+    seed=None,
+    pipelined=False,
+    metrics=None,
+    fast_forward=False,
+):
+    """
+    Runs the simulation until every node in G has all_data.
+
+    At every time step, `relax` is called on every node, the
+    utilizations are logged and reset, and the buffers are
+    committed to the nodes' data.
+
+    G: Topology, as built by `make_graph`.
+    all_data: A set of the data that is to be transferred.
+    relax: A relax method (see relaxations.py).
+    max_time: If given, gives up after this many time steps
+              (useful when the data cannot reach every node).
+    verbose: Print the utilization and data table every time step.
+    profiler: If given, a Profiler (see profiling.py) that the time
+              spent in every phase is added to.
+    trusted: Run `send` in trusted mode (see set_trusted): transfers
+             are applied, and checked unless running with -O, once
+             per time step instead of on every send.
+    seed: Seeds the random generator of the run (anything accepted
+          by numpy.random.default_rng, e.g. an int or a SeedSequence).
+          Runs with the same seed are identical.
+    pipelined: Let nodes forward the data they receive within the same
+               time step (see relay_pass). Implies trusted. Raises
+               ValueError for relax methods that opt out of it (see
+               RELAX_X_TEMPLATE).
+    metrics: If given, a Metrics (see metrics.py) that records the
+             utilization of every node and link at every time step.
+             Implies trusted.
+    fast_forward: Once every node has sent and received the same
+                  amount of data for STABLE_TICKS time steps in a row,
+                  skip ahead as many time steps as the senders can
+                  keep that up (see SteadyState and skip_ahead). Implies
+                  trusted, and cannot be combined with metrics. Raises
+                  ValueError for relax methods that opt out of it, like
+                  those that keep their own state.
+
+    Returns the completion time.
+    """
+    if fast_forward and metrics is not None:
+        raise ValueError("fast_forward cannot be combined with metrics")
+    if pipelined and not _supports(relax, "pipelined"):
+        raise ValueError("{} cannot be run pipelined".format(_name(relax)))
+    if fast_forward and not _supports(relax, "fast_forward"):
+        raise ValueError("{} cannot be fast-forwarded".format(_name(relax)))
+
+    G.graph["rng"] = np.random.default_rng(seed)
+    trusted = trusted or pipelined or metrics is not None or fast_forward
+    set_trusted(G, trusted)
+    try:
+        return _run(
+            G,
+            all_data,
+            relax,
+            max_time,
+            verbose,
+            profiler,
+            trusted,
+            pipelined,
+            metrics,
+            fast_forward,
+        )
+    finally:
+        set_trusted(G, False)
+
+
+def _supports(relax, mode):
+    """
+    Returns whether the relax method (or the function it is a
+    functools.partial of) can be run in `mode`, "pipelined" or
+    "fast_forward".
+    """
+    return getattr(getattr(relax, "func", relax), mode, True)
+
+
+def _name(relax):
+    return getattr(getattr(relax, "func", relax), "__name__", repr(relax))
+
+
+def _no_clock():
+    return 0
+
+
+def _no_add(name, elapsed, calls=1):
+    pass
+
+
+def _run(
+    G,
+    all_data,
+    relax,
+    max_time,
+    verbose,
+    profiler,
+    trusted,
+    pipelined,
+    metrics,
+    fast_forward,
+):
+    """
+    The time step loop of run_simulation. Every phase is timed with
+    `profiler` if given; otherwise the clock and the counters are
+    no-ops, which costs a few calls per time step.
+    """
+    if profiler is not None:
+        clock, add = profiler.clock, profiler.add
+        G.graph["profiler"] = profiler
+        profiler.start()
+    else:
+        clock, add = _no_clock, _no_add
+    relax_name = "relax:" + _name(relax)
+
+    time = 0
+    steady = SteadyState() if fast_forward else None
+    try:
+        while True:
+            start = clock()
+            done = completed(G, all_data)
+            add("completed", clock() - start)
+            if done or (max_time is not None and time >= max_time):
+                break
+
+            start = clock()
+            start_time_step(G, all_data, time)
+            add("start_time_step", clock() - start)
+
+            start = clock()
+            for node in G.nodes:
+                relax(G, node, all_data)
+            elapsed = clock() - start
+            add("relax", elapsed)
+            add(relax_name, elapsed, calls=len(G))
+            time += 1
+
+            if pipelined:
+                start = clock()
+                relay_pass(G)
+                add("relay_pass", clock() - start)
+            elif trusted:
+                start = clock()
+                apply_transfers(G)
+                add("apply_transfers", clock() - start)
+
+            if metrics is not None:
+                start = clock()
+                metrics.record(G)
+                add("metrics", clock() - start)
+
+            start = clock()
+            util = get_util_percents(G, all_data)
+            add("get_util_percents", clock() - start)
+            logging.info(util)
+            if verbose:
+                print(util)
+
+            if steady is not None:
+                start = clock()
+                steady.observe(G)
+                add("fast_forward", clock() - start)
+
+            start = clock()
+            reset_utils(G)
+            add("reset_utils", clock() - start)
+
+            start = clock()
+            commit_buffer(G)
+            add("commit_buffer", clock() - start)
+            if verbose:
+                print_data(G)
+
+            if steady is not None:
+                start = clock()
+                skipped = steady.skip(
+                    G, None if max_time is None else max_time - time
+                )
+                add("fast_forward", clock() - start)
+                if skipped:
+                    time += skipped
+                    logging.info("fast-forwarded {} time steps".format(skipped))
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profiler.ticks += time
+            del G.graph["profiler"]
+
+    return time
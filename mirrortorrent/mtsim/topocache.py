@@ -0,0 +1,136 @@
+"""
+A cache of graph topologies, shared between processes.
+
+A topology is stored as two NumPy files: the bandwidth of every node,
+and the nodes x nodes matrix of link capacities. They are named after
+a hash of the generator and its parameters, so parallel runs of a
+sweep that use the same graph only build it once.
+
+The least recently used topologies are deleted when the cache grows
+past its disk budget.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from .graph import make_boring_graph, make_highlow_graph, make_trace_graph
+from .cache import CACHE_DIR as _MTSIM_CACHE_DIR
+from .topology import Topology
+
+# Bump when a generator changes, so that old cached topologies are
+# not used.
+TOPOLOGY_VERSION = 1
+
+CACHE_DIR = os.path.join(_MTSIM_CACHE_DIR, "topologies")
+
+# Disk budget of the cache, in bytes.
+BUDGET = 1024 ** 3
+
+GENERATORS = {
+    "boring": make_boring_graph,
+    "highlow": make_highlow_graph,
+    "trace": make_trace_graph,
+}
+
+
+def topology_key(generator, params):
+    """
+    Returns the cache key of a generator and its parameters (a dict of
+    keyword arguments, without all_data).
+    """
+    text = json.dumps([TOPOLOGY_VERSION, generator, params], sort_keys=True)
+    return "{}-{}".format(generator, hashlib.sha256(text.encode()).hexdigest()[:24])
+
+
+def capacity_arrays(G):
+    """
+    Returns the bandwidth vector and the link capacity matrix of G (0
+    where there is no link).
+    """
+    num_nodes = len(G)
+    bandwidths = np.array([state.bw for state in G.states], dtype=np.int64)
+    capacities = np.zeros((num_nodes, num_nodes), dtype=np.int64)
+    for node, links in enumerate(G.links):
+        if links:
+            capacities[node, list(links)] = [link.weight for link in links.values()]
+    return bandwidths, capacities
+
+
+def cached_graph(generator, all_data, cache_dir=CACHE_DIR, budget=BUDGET, **params):
+    """
+    Returns the graph made by GENERATORS[generator](all_data, **params),
+    like the generator would, from the cache in `cache_dir` if it is
+    there, or else building it and adding it to the cache.
+
+    Only generators whose graphs are fully connected with node 0 holding
+    all_data (like all those in GENERATORS) can be cached, since only the
+    capacities are stored. A graph loaded from the cache shares one
+    read-only Link between the links of each capacity (see
+    Topology.from_arrays); a freshly built one does not.
+    """
+    key = topology_key(generator, params)
+    bw_path = os.path.join(cache_dir, key + ".bw.npy")
+    cap_path = os.path.join(cache_dir, key + ".cap.npy")
+
+    # The bandwidth file is written last, so if it is there, so is the
+    # capacity file.
+    if os.path.exists(bw_path):
+        try:
+            bandwidths = np.load(bw_path)
+            capacities = np.load(cap_path)
+            os.utime(bw_path)
+        except (OSError, ValueError):
+            # Evicted or replaced by another process in the meantime.
+            return _build(generator, all_data, cache_dir, budget, params)
+
+        G = Topology.from_arrays(bandwidths, capacities)
+        G.nodes[0]["data"] = all_data
+        return G
+
+    return _build(generator, all_data, cache_dir, budget, params)
+
+
+def _build(generator, all_data, cache_dir, budget, params):
+    G = GENERATORS[generator](all_data=all_data, **params)
+    bandwidths, capacities = capacity_arrays(G)
+
+    key = topology_key(generator, params)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to temporary files first, so that parallel runs never read
+    # a half-written topology.
+    for suffix, array in ((".cap.npy", capacities), (".bw.npy", bandwidths)):
+        path = os.path.join(cache_dir, key + suffix)
+        tmp_path = "{}.{}.tmp.npy".format(path[: -len(".npy")], os.getpid())
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    evict(cache_dir, budget)
+    return G
+
+
+def evict(cache_dir=CACHE_DIR, budget=BUDGET):
+    """
+    Deletes the least recently used topologies until the cache takes at
+    most `budget` bytes.
+    """
+    entries = []
+    for bw_path in glob.glob(os.path.join(cache_dir, "*.bw.npy")):
+        cap_path = bw_path[: -len(".bw.npy")] + ".cap.npy"
+        try:
+            size = os.path.getsize(bw_path) + os.path.getsize(cap_path)
+            entries.append((os.path.getmtime(bw_path), size, bw_path, cap_path))
+        except OSError:
+            continue
+
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, bw_path, cap_path in sorted(entries):
+        if total <= budget:
+            break
+        for path in (bw_path, cap_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
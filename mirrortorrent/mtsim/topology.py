@@ -0,0 +1,244 @@
+"""
+A compact graph for the simulation, used instead of a NetworkX graph.
+
+Nodes are the integers 0...num_nodes-1. The state of every node is a
+NodeState record, and the links out of every node are a dict from
+neighbor -> Link (or a LinkRow, which behaves like one, for graphs
+loaded from arrays), so reading or updating a node or a link is an index
+and an attribute access rather than a chain of NetworkX dict lookups.
+
+Topology mimics the parts of the NetworkX DiGraph API the relax methods
+use (G.nodes[n]["bw"], G[s][r]["weight"], G.neighbors(n), G.graph, ...),
+so relax methods written against NetworkX graphs keep working. Faster
+code can use G.states[n].bw and G.links[s][r].weight directly.
+"""
+
+from collections.abc import Mapping
+from itertools import chain
+import networkx as nx
+import numpy as np
+
+NODE_ATTRIBUTES = ("data", "buffer", "bw", "send_util", "rcv_util")
+
+
+class NodeState:
+    """
+    The state of a single node. Supports node["bw"] style access
+    as well as node.bw.
+    """
+
+    __slots__ = NODE_ATTRIBUTES
+
+    def __init__(self, bw, data=None):
+        self.data = set() if data is None else data
+        self.buffer = set()
+        self.bw = bw
+        self.send_util = 0
+        self.rcv_util = 0
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+
+class Link:
+    """
+    A link to a neighbor. Supports link["weight"] style access
+    as well as link.weight.
+    """
+
+    __slots__ = ("weight",)
+
+    def __init__(self, weight):
+        self.weight = weight
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+
+class SharedLink(Link):
+    """
+    A read-only Link, shared by all the links of a Topology.from_arrays
+    graph that have its capacity. To change the capacity of one of them,
+    replace it: G.links[s][r] = Link(weight).
+    """
+
+    __slots__ = ()
+
+    def __init__(self, weight):
+        object.__setattr__(self, "weight", weight)
+
+    def __setattr__(self, key, value):
+        raise TypeError(
+            "This Link is shared between links of equal capacity; "
+            "replace it with G.links[s][r] = Link(weight) instead"
+        )
+
+    __setitem__ = __setattr__
+
+
+class LinkRow(Mapping):
+    """
+    The links out of a node of a fully connected graph, backed by a
+    list of Links indexed by neighbor (the entry of the node itself is
+    ignored). Behaves like the dict of neighbor -> Link that Topology()
+    builds, except that replacing a Link only changes this row.
+    """
+
+    __slots__ = ("_node", "_links")
+
+    def __init__(self, node, links):
+        self._node = node
+        self._links = links
+
+    def __getitem__(self, neighbor):
+        if neighbor == self._node or neighbor < 0:
+            raise KeyError(neighbor)
+        try:
+            return self._links[neighbor]
+        except IndexError:
+            raise KeyError(neighbor) from None
+
+    def __setitem__(self, neighbor, link):
+        if neighbor not in self:
+            raise KeyError(neighbor)
+        self._links[neighbor] = link
+
+    def __iter__(self):
+        return chain(range(self._node), range(self._node + 1, len(self._links)))
+
+    def __len__(self):
+        return len(self._links) - 1
+
+    def __contains__(self, neighbor):
+        return neighbor != self._node and 0 <= neighbor < len(self._links)
+
+
+class NodeView:
+    """
+    Stands in for G.nodes: iterating over it gives the nodes, and
+    indexing it with a node gives the node's NodeState.
+    """
+
+    __slots__ = ("_states",)
+
+    def __init__(self, states):
+        self._states = states
+
+    def __getitem__(self, node):
+        return self._states[node]
+
+    def __iter__(self):
+        return iter(range(len(self._states)))
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, node):
+        return 0 <= node < len(self._states)
+
+    def __call__(self):
+        return self
+
+
+class Topology:
+    """
+    bandwidths: A list containing the bandwidth of every node.
+    edges: A map (or list) containing 0...num_nodes-1, with values
+           that are lists of size num_nodes, containing the link
+           capacities from key->index. edges[x][x] is ignored.
+    """
+
+    def __init__(self, bandwidths, edges):
+        num_nodes = len(bandwidths)
+        assert len(edges) == num_nodes
+
+        self.graph = {}
+        self.states = [NodeState(bw) for bw in bandwidths]
+        self.links = []
+        nodes = range(num_nodes)
+        for i in nodes:
+            # Building the dict from all the links and dropping the
+            # self-link is faster than skipping it in a comprehension.
+            links = dict(zip(nodes, map(Link, edges[i])))
+            del links[i]
+            self.links.append(links)
+        self.nodes = NodeView(self.states)
+
+    def __iter__(self):
+        return iter(range(len(self.states)))
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, node):
+        return 0 <= node < len(self.states)
+
+    def __getitem__(self, node):
+        return self.links[node]
+
+    def neighbors(self, node):
+        return iter(self.links[node])
+
+    def to_networkx(self):
+        """
+        Returns a NetworkX DiGraph with the same nodes, links and node
+        attributes (for drawing the graph, not for simulating on it).
+        The data sets are shared, not copied.
+        """
+        G = nx.DiGraph()
+        for i, state in enumerate(self.states):
+            G.add_node(i, **{key: getattr(state, key) for key in NODE_ATTRIBUTES})
+        for i, links in enumerate(self.links):
+            for j, link in links.items():
+                G.add_edge(i, j, weight=link.weight)
+        return G
+
+    @classmethod
+    def from_arrays(cls, bandwidths, capacities):
+        """
+        Builds a fully connected Topology from a vector of bandwidths and
+        a nodes x nodes matrix of link capacities (NumPy arrays, e.g.
+        loaded by topocache).
+
+        Rather than a Link per link, there is a SharedLink per distinct
+        capacity, and the links out of every node are a LinkRow over the
+        matching row of the matrix, so building it takes no Python loop
+        over the links.
+        """
+        T = cls.__new__(cls)
+        T.graph = {}
+        T.states = [NodeState(bw) for bw in bandwidths.tolist()]
+        T.nodes = NodeView(T.states)
+
+        weights, index = np.unique(capacities, return_inverse=True)
+        shared = np.empty(len(weights), dtype=object)
+        shared[:] = [SharedLink(weight) for weight in weights.tolist()]
+        rows = shared[index.reshape(capacities.shape)].tolist()
+        T.links = [LinkRow(i, row) for i, row in enumerate(rows)]
+        return T
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Builds a Topology from a NetworkX graph with nodes 0...n-1 that
+        have the attributes set by make_graph. Only the links in G are
+        kept.
+        """
+        num_nodes = len(G)
+        assert set(G.nodes) == set(range(num_nodes))
+
+        no_edges = [[0] * num_nodes] * num_nodes
+        T = cls([G.nodes[i]["bw"] for i in range(num_nodes)], no_edges)
+        for i, state in enumerate(T.states):
+            for key in NODE_ATTRIBUTES:
+                setattr(state, key, G.nodes[i][key])
+            T.links[i] = {j: Link(G[i][j]["weight"]) for j in G.successors(i)}
+
+        T.graph.update(G.graph)
+        return T
@@ -3,6 +3,7 @@ Utility methods for the graphs
 """
 
 import logging
+import numpy as np
 from prettytable import PrettyTable
 
 def get_missing_data(G, node, all_data):
@@ -11,10 +12,10 @@ def get_missing_data(G, node, all_data):
     Computes a map from node.neighbors -> data they are missing.
     Returns the map.
     """
-    neighbors = G.neighbors(node)
+    states = G.states
     missing_data = {}
-    for neighbor in neighbors:
-        missing_data[neighbor] = all_data.difference(G.nodes[neighbor]["data"])
+    for neighbor in G.links[node]:
+        missing_data[neighbor] = all_data.difference(states[neighbor].data)
 
     return missing_data
 
@@ -30,16 +31,85 @@ def get_suppliable_missing_data(G, node, missing_data):
     This map is essentially a map from nodes to whom data can be supplied,
     to the data that can be supplied.
     """
+    states = G.states
+    data = states[node].data
     suppliable_missing_data = {}
 
     for neighbor, neighbor_missingdata in missing_data.items():
-        suppliable_data = neighbor_missingdata.intersection(G.nodes[node]["data"])
-        if suppliable_data and (G.nodes[neighbor]["rcv_util"] != G.nodes[neighbor]["bw"]):
+        suppliable_data = neighbor_missingdata.intersection(data)
+        neighbor_state = states[neighbor]
+        if suppliable_data and (neighbor_state.rcv_util != neighbor_state.bw):
             suppliable_missing_data[neighbor] = suppliable_data
 
     return suppliable_missing_data
 
 
+def get_rng(G):
+    """
+    Returns the graph's random generator, G.graph["rng"] (set by
+    run_simulation). All randomness in the relax methods should come
+    from here, so that a run can be reproduced from its seed.
+
+    Creates an unseeded generator if the graph doesn't have one.
+    """
+    rng = G.graph.get("rng")
+    if rng is None:
+        rng = G.graph["rng"] = np.random.default_rng()
+    return rng
+
+
+def start_time_step(G, all_data, time):
+    """
+    Should be called at the start of every time step, before the relax
+    method. Records the time step in G.graph["time"] (for relax methods
+    that keep state across time steps) and calls shuffle_priorities.
+    """
+    G.graph["time"] = time
+    shuffle_priorities(G, all_data)
+
+
+def shuffle_priorities(G, all_data):
+    """
+    Should be called at the start of a time step.
+
+    Draws a random priority for every piece of data, and a random
+    sending and receiving offset for every node, in one go.
+    sample_data uses these for the rest of the time step. Data must
+    be integers in 0...max(all_data).
+    """
+    rng = get_rng(G)
+    size = max(all_data) + 1 if all_data else 0
+    G.graph["priorities"] = rng.permutation(size)
+    G.graph["offsets"] = rng.integers(max(size, 1), size=(2, len(G)))
+
+
+def sample_data(G, sender, reciever, data, k):
+    """
+    Returns a set of k items of data (or all of it, if there are
+    fewer), chosen at random, for `sender` to send to `reciever`.
+
+    Takes the items with the lowest priority (see shuffle_priorities),
+    rotated by the sender's and the receiver's offsets, so this draws
+    no new random numbers, and a sender sends different data to
+    different receivers. Falls back to a fresh draw if the priorities
+    have not been shuffled.
+    """
+    if k >= len(data):
+        return set(data)
+    if k <= 0:
+        return set()
+
+    pieces = np.fromiter(data, dtype=np.int64, count=len(data))
+    priorities = G.graph.get("priorities")
+    if priorities is None:
+        return set(get_rng(G).choice(pieces, k, replace=False).tolist())
+
+    offsets = G.graph["offsets"]
+    offset = offsets[0][sender] + offsets[1][reciever]
+    keys = (priorities[pieces] + offset) % len(priorities)
+    return set(pieces[np.argpartition(keys, k - 1)[:k]].tolist())
+
+
 def send(G, sender, reciever, data):
     """First, ensures the following.
 
@@ -57,49 +127,123 @@ def send(G, sender, reciever, data):
     data to the receiver's data, setting the
     receiver'sp rcv_util, and setting the sender's
     send_util.
+
+    If a Profiler is attached to the graph (G.graph["profiler"]),
+    the time spent here is added to its "send" phase.
+
+    If the graph is in trusted mode (see set_trusted), none of the
+    above is checked here: the utils are updated, and the transfer
+    is queued to be applied (and checked) by apply_transfers.
     """
+    profiler = G.graph.get("profiler")
+    if profiler is not None:
+        start = profiler.clock()
+
+    transfers = G.graph.get("transfers")
+    if transfers is not None:
+        transfers.append((sender, reciever, data))
+        G.states[reciever].rcv_util += len(data)
+        G.states[sender].send_util += len(data)
+        if profiler is not None:
+            profiler.add("send", profiler.clock() - start)
+        return
+
     sender_num = sender
     reciever_num = reciever
-    sender = G.nodes[sender]
-    reciever = G.nodes[reciever]
+    sender = G.states[sender]
+    reciever = G.states[reciever]
 
-    assert data.issubset(sender["data"])
-    assert len(data.intersection(reciever["data"])) == 0
-    assert len(data) <= G[sender_num][reciever_num]["weight"]
-    assert len(data) + sender["send_util"] <= sender["bw"]
-    assert len(data) + reciever["rcv_util"] <= reciever["bw"]
+    assert data.issubset(sender.data)
+    assert len(data.intersection(reciever.data)) == 0
+    assert len(data) <= G.links[sender_num][reciever_num].weight
+    assert len(data) + sender.send_util <= sender.bw
+    assert len(data) + reciever.rcv_util <= reciever.bw
 
-    reciever["buffer"].update(data)
+    reciever.buffer.update(data)
 
-    reciever["rcv_util"] += len(data)
-    sender["send_util"] += len(data)
+    reciever.rcv_util += len(data)
+    sender.send_util += len(data)
 
     logging.debug(f"{sender_num} is sending {data} (size:{len(data)}) to {reciever_num}")
 
+    if profiler is not None:
+        profiler.add("send", profiler.clock() - start)
+
+
+def set_trusted(G, trusted):
+    """
+    Puts the graph in (or takes it out of) trusted mode.
+
+    In trusted mode, `send` skips its checks and queues the transfers
+    in G.graph["transfers"]. apply_transfers must then be called at
+    the end of every time step, before get_util_percents. The queue
+    keeps the time step's transfers until reset_utils.
+    """
+    if trusted:
+        G.graph["transfers"] = []
+    else:
+        G.graph.pop("transfers", None)
+
+
+def apply_transfers(G):
+    """
+    Should be called at the end of a time step in trusted mode.
+
+    Adds the data of every queued transfer to its receiver's buffer.
+    Unless Python is run with -O, first checks all the transfers at
+    once with check_transfers.
+    """
+    transfers = G.graph["transfers"]
+    if __debug__:
+        check_transfers(G, transfers)
+
+    states = G.states
+    for sender, reciever, data in transfers:
+        states[reciever].buffer.update(data)
+
+
+def check_transfers(G, transfers):
+    """
+    Checks the same things as `send`, for a whole time step of
+    transfers at once. Must be called before the utils are reset
+    and the buffers are committed.
+    """
+    states = G.states
+    for sender, reciever, data in transfers:
+        assert data.issubset(states[sender].data)
+        assert data.isdisjoint(states[reciever].data)
+        assert len(data) <= G.links[sender][reciever].weight
+
+    for state in states:
+        assert state.send_util <= state.bw
+        assert state.rcv_util <= state.bw
+
 
 def get_util_percents(G, all_data):
     """Returns the percentage of the send, recv 
     utilization for the graph. 
 
-    This should be called at the end of a time step.
+    This should be called at the end of a time step,
+    before commit_buffer.
     """
     total_possible_bw = 0
     used_rcv_bw = 0
-    for node in G:
-        # At this time step, compute how much data we recieved.
-        used_rcv_bw += G.nodes[node]["rcv_util"]
+    for state in G.states:
+        # At this time step, compute how much new data we recieved.
+        # Two senders may have sent us the same piece, so count the
+        # distinct pieces in the buffer rather than rcv_util.
+        used_rcv_bw += len(state.buffer - state.data)
 
         # Then compute how much data we were missing at the START of this time step.
-        # Suppose at the start of this time step, I had 85 units of data.
-        # rcv_util now is 5 (so I am getting 5 more units at this time step.)
-        # G.nodes[node]["data"] is therefore equal to 90.
-        # all_data is 100 units.
-        # So 100 - 90 + 5 is how much data I was missing at the beginning.
-        max_possible_recv = len(all_data) - len(G.nodes[node]["data"]) + used_rcv_bw
+        # The data recieved at this time step is still in the buffer, so
+        # G.nodes[node]["data"] is what we had at the start.
+        # Suppose I had 85 units of data, and all_data is 100 units.
+        # So 100 - 85 is how much data I was missing at the beginning.
+        max_possible_recv = len(all_data) - len(state.data)
 
         # My total recieve util could be at most either the data I had to recieve
         # or my total bnadiwdth, and no more.
-        total_possible_bw += min(max_possible_recv, G.nodes[node]["bw"])
+        total_possible_bw += min(max_possible_recv, state.bw)
 
     return used_rcv_bw / total_possible_bw
 
@@ -108,11 +252,16 @@ def reset_utils(G):
     """Should be called at the end of a time stamp,
     after retrieving the utilization percentages
     in order to reset the utilizations for the
-    next time step.
+    next time step. Also empties the queue of
+    transfers in trusted mode.
     """
-    for node in G:
-        G.nodes[node]["send_util"] = 0
-        G.nodes[node]["rcv_util"] = 0
+    transfers = G.graph.get("transfers")
+    if transfers is not None:
+        transfers.clear()
+
+    for state in G.states:
+        state.send_util = 0
+        state.rcv_util = 0
 
 
 def completed(G, all_data):
@@ -121,8 +270,8 @@ def completed(G, all_data):
     The process is complete when all nodes have
     all the data.
     """
-    for node in G.nodes:
-        if G.nodes[node]["data"] != all_data:
+    for state in G.states:
+        if state.data != all_data:
             return False
     return True
 
@@ -143,14 +292,16 @@ def get_max_possible_rate(G, sender, receiver):
     link bandwidth between the sender and receiver, the
     remaining send bandwidth of the sender, and the remaining
     receive bandwidth of the receiver" 
-    :param G: NetworkX Graph.
-    :param sender: Node (number) in networkX graph.
-    :param receiver: Node (number) in networkX graph.
+    :param G: Topology.
+    :param sender: Node (number) in the graph.
+    :param receiver: Node (number) in the graph.
     :return: 
     """
-    link_bw = G[sender][receiver]["weight"]
-    remaining_send_bw = G.nodes[sender]["bw"] - G.nodes[sender]["send_util"]
-    remaining_recv_bw = G.nodes[receiver]["bw"] - G.nodes[receiver]["rcv_util"]
+    sender_state = G.states[sender]
+    receiver_state = G.states[receiver]
+    link_bw = G.links[sender][receiver].weight
+    remaining_send_bw = sender_state.bw - sender_state.send_util
+    remaining_recv_bw = receiver_state.bw - receiver_state.rcv_util
 
     return min(link_bw, remaining_recv_bw, remaining_send_bw)
 
@@ -175,9 +326,9 @@ def commit_buffer(G):
     """
     Commits the buffer placed in all nodes in the graph
     to the actual data.
-    :param G: NetworkX Graph
+    :param G: Topology
     :return: None
     """
-    for node in G.nodes():
-        G.nodes[node]["data"].update(G.nodes[node]["buffer"])
+    for state in G.states:
+        state.data.update(state.buffer)
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Chooses the initial placement of a directory's bins onto the servers
+by simulating candidate placements on a graph calibrated from
+measured transfer rates.
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from distribute import collect_files, get_sizes, do_binpack_distribution, bin_sizes
+from mtsim.graph import make_trace_graph
+from mtsim.planner import bins_to_pieces, plan_placement
+from mtsim.relaxations import RELAXATIONS
+
+
+def load_trace_rates(trace_dir):
+    """
+    Takes in a directory of parsed vnstat csvs (see scripts/parseraw.py).
+
+    Returns a list of machine names and a list of their average
+    rates (Mbit/s), in the same order. Machines without any
+    samples, or that averaged 0 Mbit/s (and so could never send or
+    receive anything), are skipped.
+    """
+    machines = []
+    rates = []
+    for filename in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, filename)) as csvfile:
+            speeds = [float(row[4]) for row in csv.reader(csvfile)]
+        if not speeds or sum(speeds) <= 0:
+            continue
+        machines.append(os.path.splitext(filename)[0])
+        rates.append(sum(speeds) / len(speeds))
+
+    return machines, rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dirpath", help="path to directory to be distributed")
+    parser.add_argument("trace_dir", help="directory of parsed csvs, e.g. ../scripts/parsed_outputs/random")
+    parser.add_argument("--distribution", nargs='+', type=int, help="target distribution of the bins (see distribute.py). Default: one even bin per server.")
+    parser.add_argument("--piece-size", type=int, default=1024 * 1024, help="size of a simulated piece in bytes")
+    parser.add_argument("--unit-rate", type=float, default=None, help="rate (Mbit/s) of one piece per time step. Default: the slowest server's rate.")
+    parser.add_argument("--relax", choices=RELAXATIONS.keys(), default="greedy")
+    parser.add_argument("--trials", type=int, default=3, help="simulations per placement")
+    parser.add_argument("--max-time", type=int, default=None, help="give up on a simulation after this many time steps")
+    parser.add_argument("--trusted", action="store_true", help="skip the per-send checks in the simulations (see run_simulation)")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random choices; runs with the same seed are identical")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    machines, rates = load_trace_rates(args.trace_dir)
+    if not machines:
+        parser.error("no machine in {} has a nonzero average rate".format(args.trace_dir))
+    unit_rate = args.unit_rate if args.unit_rate else min(rates)
+
+    filesizes_map = get_sizes(collect_files(args.dirpath))
+    distribution = args.distribution if args.distribution else [1 for m in machines]
+    bins = do_binpack_distribution(filesizes_map, distribution)
+    bin_pieces, all_data = bins_to_pieces(bins, args.piece_size)
+
+    G = make_trace_graph(all_data, rates, unit_rate)
+    placement, time, cache = plan_placement(
+        G,
+        bin_pieces,
+        all_data,
+        relax=RELAXATIONS[args.relax],
+        trials=args.trials,
+        max_time=args.max_time,
+        processes=args.processes,
+        trusted=args.trusted,
+        seed=args.seed,
+    )
+
+    print("Simulated", len(cache), "placements")
+    sizes = bin_sizes(bins)
+    for i, node in enumerate(placement):
+        print("bin {} ({:,} bytes) -> {}".format(i, sizes[i], machines[node]))
+    print("Predicted completion time was", time)
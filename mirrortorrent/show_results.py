@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Compares the relax methods over the runs in a results store (see
+mtsim/results.py).
+"""
+
+import argparse
+import json
+
+from mtsim.results import ResultsStore
+
+
+def parse_param(param):
+    """
+    Parses KEY=VALUE, where VALUE is read as JSON if it can be (so 1 is
+    a number and true a boolean), and as a string otherwise.
+    """
+    key, _, value = param.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("results", help="SQLite results store, e.g. written by simulate.py --results")
+    parser.add_argument("--generator", help="only show runs on graphs from this generator")
+    parser.add_argument("--nodes", type=int, help="only show runs with this many nodes")
+    parser.add_argument("--pieces", type=int, help="only show runs with this many pieces")
+    parser.add_argument("--relax", help="only show runs of this relax method")
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="only show runs with this parameter value, e.g. link_cap=1 (repeatable)",
+    )
+    args = parser.parse_args()
+
+    filters = {
+        "generator": args.generator,
+        "num_nodes": args.nodes,
+        "num_pieces": args.pieces,
+        "relax": args.relax,
+        "params": dict(parse_param(p) for p in args.param) or None,
+    }
+    with ResultsStore(args.results) as store:
+        print(store.summary(**{k: v for k, v in filters.items() if v is not None}))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import argparse
 import networkx as nx
 import math
 import random
@@ -8,31 +9,79 @@ import logging
 #import matplotlib.pyplot as plt
 
 from mtsim.graph import make_boring_graph, make_highlow_graph
-from mtsim.relaxations import relax_dummy, relax_send_equal, relax_send_greedy
+from mtsim.metrics import Metrics
+from mtsim.profiling import Profiler
+from mtsim.relaxations import RELAXATIONS
+from mtsim.results import ResultsStore
+from mtsim.simulation import run_simulation
 from mtsim.utils import *
 
 logging.basicConfig(filename="example.log", level=logging.DEBUG)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--relax", choices=RELAXATIONS.keys(), default="equal")
+    parser.add_argument("--profile", action="store_true", help="time every phase of the simulation and print a summary table")
+    parser.add_argument("--cprofile", metavar="FILE", help="also run under cProfile and dump the stats to FILE")
+    parser.add_argument("--trusted", action="store_true", help="skip the per-send checks, checking each time step in bulk instead (unless run with -O)")
+    parser.add_argument("--pipelined", action="store_true", help="let nodes forward data within the time step they receive it")
+    parser.add_argument("--metrics", action="store_true", help="record per-node and per-link utilization and print the bottlenecks")
+    parser.add_argument("--fast-forward", action="store_true", help="skip ahead through time steps that repeat the same transfers")
+    parser.add_argument("--results", metavar="FILE", help="record the run in the SQLite results store FILE (see show_results.py)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random choices; runs with the same seed are identical")
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile or args.cprofile:
+        profiler = Profiler(cprofile=bool(args.cprofile))
+
     all_data = set([i for i in range(4)])
     # G = make_boring_graph(100, all_data, 4, 100)
-    G = make_boring_graph(
-        5, all_data, 4, 1
-    )
+    graph_params = {"num_nodes": 5, "bandwidth": 4, "link_cap": 1}
+    G = make_boring_graph(all_data=all_data, **graph_params)
+
+    metrics = Metrics(G, all_data) if args.metrics else None
 
-    time = 0
     # draw_graph(G, "temp.png")
-    while not completed(G, G.nodes[0]["data"]):
-        for node in G.nodes:
-            relax_send_equal(G, node, all_data)
-            # print(G.nodes.data())
-        time += 1
-        logging.info(get_util_percents(G, all_data))
-        print(get_util_percents(G, all_data))
-        reset_utils(G)
-        commit_buffer(G)
-        print_data(G)
+    time = run_simulation(
+        G,
+        all_data,
+        RELAXATIONS[args.relax],
+        verbose=True,
+        profiler=profiler,
+        trusted=args.trusted,
+        seed=args.seed,
+        pipelined=args.pipelined,
+        metrics=metrics,
+        fast_forward=args.fast_forward,
+    )
 
     time_to_completion = time
 
     print("Completion time was", time_to_completion)
+
+    if metrics is not None:
+        print(metrics.summary())
+
+    if args.results:
+        with ResultsStore(args.results) as store:
+            store.add(
+                "boring",
+                dict(
+                    graph_params,
+                    trusted=args.trusted,
+                    pipelined=args.pipelined,
+                    fast_forward=args.fast_forward,
+                ),
+                len(G),
+                len(all_data),
+                args.relax,
+                time_to_completion,
+                seed=args.seed,
+                metrics=metrics,
+            )
+
+    if profiler is not None:
+        profiler.log_summary()
+        if args.cprofile:
+            profiler.dump_stats(args.cprofile)
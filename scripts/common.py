@@ -1,7 +1,3 @@
-from torf import Torrent
-import argparse
-from paramiko import SSHClient
-from scp import SCPClient
 import os
 import csv
 import shutil
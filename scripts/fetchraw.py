@@ -1,7 +1,4 @@
-from torf import Torrent
 import argparse
-from paramiko import SSHClient
-from scp import SCPClient
 import os
 import csv
 import shutil
@@ -20,11 +17,14 @@ def fetchall_vnstat(dirname):
 	./ouputs. Places the csvs in the inner directory.
 	"""
 
+	# paramiko is slow to import, so only import it when fetching.
+	from paramiko import SSHClient
+
 	# ssh init
 	ssh = SSHClient()
 	ssh.load_system_host_keys()
 
-
+	directory_path = "raw_outputs/" + dirname
 	mkdir_safe(directory_path)
 
 	results = {}
@@ -1,7 +1,4 @@
-from torf import Torrent
 import argparse
-from paramiko import SSHClient
-from scp import SCPClient
 import os
 from os.path import isfile, join
 import csv
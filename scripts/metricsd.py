@@ -0,0 +1,382 @@
+import argparse
+import calendar
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from common import SERVERS, machine_name
+from parseraw import canonicalize
+
+# A collector that polls `vnstat -5` on every server on an interval, and
+# keeps the samples and their rollups in memory-mapped ring buffers, one
+# file per host and resolution, in a store directory:
+#
+#	<store>/<host>.5min	every 5 minute sample
+#	<store>/<host>.hour	hourly rollups
+#	<store>/<host>.day	daily rollups
+#
+# The rollups are updated as samples come in, so querying the fleet's
+# throughput over any window reads whole days and hours from the
+# rollups and only the 5 minute samples at the edges of the window,
+# without going back to the raw csvs.
+#
+# Times are seconds since the epoch, in UTC (vnstat's times are taken
+# to be UTC). Rollup buckets start at multiples of their length.
+
+RECORD = np.dtype([("time", "<i8"), ("rx", "<f8"), ("tx", "<f8"), ("samples", "<i8")])
+HEADER_SIZE = 64
+
+# (name, seconds per bucket, capacity of the ring buffer)
+RESOLUTIONS = [
+	("5min", 300, 12 * 24 * 35),
+	("hour", 3600, 24 * 400),
+	("day", 86400, 3650),
+]
+
+KEY_FILENAME = "/Users/mudit2103/.ssh/mirrortorrent.pem"
+
+
+class Ring:
+	"""
+	A ring buffer of `capacity` RECORDs in a memory-mapped file.
+	The header holds the index of the next record to write and the
+	number of records written so far.
+	"""
+
+	def __init__(self, path, capacity):
+		if not os.path.exists(path):
+			with open(path, "wb") as f:
+				f.truncate(HEADER_SIZE + capacity * RECORD.itemsize)
+
+		self.header = np.memmap(path, dtype="<i8", mode="r+", shape=(2,))
+		self.records = np.memmap(path, dtype=RECORD, mode="r+", offset=HEADER_SIZE)
+		self.capacity = len(self.records)
+
+	def __len__(self):
+		return int(min(self.header[1], self.capacity))
+
+	def last(self):
+		"""
+		Returns the index of the newest record, or None if empty.
+		"""
+		if not self.header[1]:
+			return None
+		return int((self.header[0] - 1) % self.capacity)
+
+	def append(self, record):
+		i = int(self.header[0])
+		self.records[i] = record
+		self.header[0] = (i + 1) % self.capacity
+		self.header[1] += 1
+
+	def add(self, bucket, rx, tx):
+		"""
+		Adds a sample to the bucket starting at `bucket`: to the newest
+		record if it is that bucket, else to a new record.
+		"""
+		i = self.last()
+		if i is not None and self.records[i]["time"] == bucket:
+			self.records[i]["rx"] += rx
+			self.records[i]["tx"] += tx
+			self.records[i]["samples"] += 1
+		else:
+			self.append((bucket, rx, tx, 1))
+
+	def sum(self, start, end):
+		"""
+		Returns the total (rx, tx, samples) of the records with start <= time < end.
+		"""
+		records = self.records[: len(self)]
+		mask = (records["time"] >= start) & (records["time"] < end)
+		return (
+			float(records["rx"][mask].sum()),
+			float(records["tx"][mask].sum()),
+			int(records["samples"][mask].sum()),
+		)
+
+	def flush(self):
+		self.header.flush()
+		self.records.flush()
+
+
+class HostStore:
+	"""
+	The ring buffers of one host, at every resolution.
+	"""
+
+	def __init__(self, directory, host):
+		self.rings = [
+			Ring(os.path.join(directory, "{}.{}".format(host, name)), capacity)
+			for name, seconds, capacity in RESOLUTIONS
+		]
+
+	def latest(self):
+		"""
+		Returns the time of the newest 5 minute sample, or None.
+		"""
+		ring = self.rings[0]
+		i = ring.last()
+		return None if i is None else int(ring.records[i]["time"])
+
+	def add_samples(self, samples):
+		"""
+		Adds the samples (time, rx MiB, tx MiB) newer than the newest
+		sample stored, in order, and updates the rollups. Returns the
+		number of samples added.
+		"""
+		latest = self.latest()
+		added = 0
+		for t, rx, tx in sorted(samples):
+			if latest is not None and t <= latest:
+				continue
+			for ring, (name, seconds, capacity) in zip(self.rings, RESOLUTIONS):
+				ring.add(t - t % seconds, rx, tx)
+			latest = t
+			added += 1
+
+		for ring in self.rings:
+			ring.flush()
+		return added
+
+	def sum(self, start, end, level=None):
+		"""
+		Returns the total (rx, tx, samples) of the 5 minute samples with
+		start <= time < end. Whole days and hours are read from the
+		rollups, and only the rest from the 5 minute samples.
+		"""
+		if level is None:
+			level = len(RESOLUTIONS) - 1
+		if start >= end:
+			return (0.0, 0.0, 0)
+		if level == 0:
+			return self.rings[0].sum(start, end)
+
+		seconds = RESOLUTIONS[level][1]
+		first = -(-start // seconds) * seconds
+		last = end // seconds * seconds
+		if first >= last:
+			return self.sum(start, end, level - 1)
+
+		parts = [
+			self.sum(start, first, level - 1),
+			self.rings[level].sum(first, last),
+			self.sum(last, end, level - 1),
+		]
+		return tuple(sum(values) for values in zip(*parts))
+
+
+def parse_vnstat(text, now=None):
+	"""
+	Takes in the output of `vnstat -5`.
+
+	Returns a list of (time, rx MiB, tx MiB) for the 5 minute intervals
+	that have ended by `now` (default: the current time). vnstat 2 puts
+	a line with the date before each day's entries. Without those (as in
+	the csvs from fetchraw.py), the newest entry is taken to be the
+	latest one at or before `now`, and the dates are counted back from it.
+	"""
+	now = time.time() if now is None else now
+
+	entries = []
+	date = None
+	for line in text.splitlines():
+		fields = line.replace("|", " ").split()
+		if len(fields) == 1 and re.match(r"^\d{4}-\d{2}-\d{2}$", fields[0]):
+			date = calendar.timegm(time.strptime(fields[0], "%Y-%m-%d"))
+			continue
+		if len(fields) < 7 or not re.match(r"^\d{1,2}:\d{2}$", fields[0]):
+			continue
+
+		hours, minutes = fields[0].split(":")
+		seconds = int(hours) * 3600 + int(minutes) * 60
+		rx = canonicalize(fields[1], fields[2])
+		tx = canonicalize(fields[3], fields[4])
+		entries.append([date, seconds, rx, tx])
+
+	if entries and entries[-1][0] is None:
+		# No date lines: count the dates back from the newest entry.
+		day = int(now) - int(now) % 86400
+		if entries[-1][1] > now - day:
+			day -= 86400
+		previous = None
+		for entry in reversed(entries):
+			if previous is not None and entry[1] > previous:
+				day -= 86400
+			previous = entry[1]
+			entry[0] = day
+
+	return [
+		(date + seconds, rx, tx)
+		for date, seconds, rx, tx in entries
+		if date is not None and date + seconds + 300 <= now
+	]
+
+
+class SSHHost:
+	"""
+	A server polled over SSH, like fetchraw.py does.
+	"""
+
+	def __init__(self, username, hostname, key_filename=KEY_FILENAME):
+		self.name = machine_name(hostname)
+		self.username = username
+		self.hostname = hostname
+		self.key_filename = key_filename
+
+	def vnstat(self, count):
+		# paramiko is slow to import, so only import it when polling servers.
+		from paramiko import SSHClient
+
+		ssh = SSHClient()
+		ssh.load_system_host_keys()
+		try:
+			ssh.connect(hostname=self.hostname, username=self.username, key_filename=self.key_filename)
+			(stdin, stdout, stderr) = ssh.exec_command("vnstat -5 {}".format(count))
+			return stdout.read().decode()
+		finally:
+			ssh.close()
+
+
+class FakeHost:
+	"""
+	A local stand-in for a server, whose `vnstat -5` output is made up
+	(in vnstat 2's format). The traffic of every 5 minute interval only
+	depends on the host's name and the interval, so every poll agrees
+	with the previous ones. `clock` gives the current time, so that the
+	collector can be run against simulated time.
+	"""
+
+	def __init__(self, name, mean_mib=50.0, clock=time.time):
+		self.name = name
+		self.mean_mib = mean_mib
+		self.clock = clock
+
+	def traffic(self, t):
+		"""
+		Returns the (rx, tx) MiB of the interval starting at t.
+		"""
+		rng = random.Random("{}-{}".format(self.name, t))
+		return rng.expovariate(1 / self.mean_mib), rng.expovariate(1 / self.mean_mib)
+
+	def vnstat(self, count):
+		now = self.clock()
+		current = int(now - now % 300)
+		lines = [
+			" eth0  /  5 minute",
+			"",
+			"        time        rx      |     tx      |    total    |   avg. rate",
+			"     ------------------------+-------------+-------------+---------------",
+		]
+		date = None
+		for t in range(current - (count - 1) * 300, current + 300, 300):
+			if time.strftime("%Y-%m-%d", time.gmtime(t)) != date:
+				date = time.strftime("%Y-%m-%d", time.gmtime(t))
+				lines.append("     " + date)
+
+			rx, tx = self.traffic(t)
+			if t == current:
+				# The current interval is still being counted.
+				done = (now - t) / 300
+				rx, tx = rx * done, tx * done
+			rate = (rx + tx) * 8.388608 / 300
+			lines.append(
+				"         {}  {:8.2f} MiB | {:8.2f} MiB | {:8.2f} MiB | {:8.2f} Mbit/s".format(
+					time.strftime("%H:%M", time.gmtime(t)), rx, tx, rx + tx, rate
+				)
+			)
+		lines.append("     ------------------------+-------------+-------------+---------------")
+		return "\n".join(lines) + "\n"
+
+
+def poll(hosts, stores, count=12, now=None):
+	"""
+	Polls every host at once for its last `count` 5 minute entries, and
+	adds the new samples to its store. Returns a dict of host name ->
+	number of samples added (or the exception, if polling failed).
+	"""
+	def poll_host(host):
+		try:
+			text = host.vnstat(count)
+		except Exception as e:
+			return e
+		return stores[host.name].add_samples(parse_vnstat(text, now))
+
+	with ThreadPoolExecutor(max(len(hosts), 1)) as executor:
+		return dict(zip([host.name for host in hosts], executor.map(poll_host, hosts)))
+
+
+def fleet_throughput(stores, start, end):
+	"""
+	Returns a dict of host name -> (rx MiB, tx MiB, average Mbit/s) over
+	start <= time < end, with the whole fleet as "total".
+	"""
+	results = {}
+	for name, store in stores.items():
+		rx, tx, samples = store.sum(start, end)
+		results[name] = (rx, tx, (rx + tx) * 8.388608 / (end - start))
+
+	rx = sum(r[0] for r in results.values())
+	tx = sum(r[1] for r in results.values())
+	results["total"] = (rx, tx, (rx + tx) * 8.388608 / (end - start))
+	return results
+
+
+def open_stores(directory, names):
+	os.makedirs(directory, exist_ok=True)
+	return {name: HostStore(directory, name) for name in names}
+
+
+def parse_time(text):
+	"""
+	Takes in a UTC time of the form 2019-05-11 16:30. Returns seconds
+	since the epoch.
+	"""
+	return calendar.timegm(time.strptime(text, "%Y-%m-%d %H:%M"))
+
+
+def make_hosts(args):
+	if args.fake:
+		return [FakeHost("fake{}".format(i)) for i in range(args.fake)]
+	return [SSHHost(username, hostname, args.key) for username, hostname in SERVERS]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("store", help="directory of the ring buffers, created if needed")
+	parser.add_argument("--fake", type=int, default=0, help="poll this many local fake hosts instead of the servers")
+	parser.add_argument("--key", default=KEY_FILENAME, help="ssh key for the servers")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = subparsers.add_parser("run", help="poll the hosts forever")
+	run_parser.add_argument("--interval", type=float, default=300, help="seconds between polls")
+	run_parser.add_argument("--count", type=int, default=12, help="5 minute entries to ask vnstat for on every poll")
+	run_parser.add_argument("--once", action="store_true", help="poll once and exit")
+
+	query_parser = subparsers.add_parser("query", help="print the throughput of every host over a window")
+	query_parser.add_argument("start", help="UTC start of the window, e.g. '2019-05-11 16:30'")
+	query_parser.add_argument("end", help="UTC end of the window (exclusive)")
+
+	args = parser.parse_args()
+	hosts = make_hosts(args)
+	stores = open_stores(args.store, [host.name for host in hosts])
+
+	if args.command == "run":
+		while True:
+			started = time.time()
+			for name, result in poll(hosts, stores, args.count).items():
+				if isinstance(result, Exception):
+					print("Polling {} failed: {}".format(name, result), file=sys.stderr)
+				elif result:
+					print("Added {} samples from {}".format(result, name))
+			if args.once:
+				break
+			time.sleep(max(0, args.interval - (time.time() - started)))
+
+	else:
+		start = parse_time(args.start)
+		end = parse_time(args.end)
+		for name, (rx, tx, rate) in fleet_throughput(stores, start, end).items():
+			print("{:<10} rx {:>12.2f} MiB  tx {:>12.2f} MiB  {:>10.3f} Mbit/s".format(name, rx, tx, rate))
@@ -1,7 +1,4 @@
-from torf import Torrent
 import argparse
-from paramiko import SSHClient
-from scp import SCPClient
 import os
 from os.path import isfile, join
 import csv
@@ -14,6 +11,7 @@ def parseraw_dir(dirname, start, end):
 	input_dirname = "raw_outputs/" + dirname
 	filepaths = [f for f in os.listdir(input_dirname) if isfile(join(input_dirname, f))]
 
+	directory_path = "parsed_outputs/" + dirname
 	mkdir_safe(directory_path)
 
 
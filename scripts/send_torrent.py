@@ -1,7 +1,4 @@
-from torf import Torrent
 import argparse
-from paramiko import SSHClient
-from scp import SCPClient
 import os
 
 
@@ -20,6 +17,8 @@ WATCH_FILES = "downloads/"
 WATCH_TORRENTS = "watch/"
 
 def make_torrent(content_path, tracker, output_name):
+	from torf import Torrent
+
 	t = Torrent(path=content_path,
             trackers=[tracker],
             comment='-')
@@ -33,6 +32,10 @@ def make_torrent(content_path, tracker, output_name):
 	return torrent_path
 
 def push(content_path, torrent_path):
+	# paramiko and scp are slow to import, so only import them when pushing.
+	from paramiko import SSHClient
+	from scp import SCPClient
+
 	ssh = SSHClient()
 	ssh.load_system_host_keys()
 	for server in SERVERS:
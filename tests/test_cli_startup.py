@@ -0,0 +1,67 @@
+"""
+Checks that the mirrortorrent CLI starts quickly: running a light
+subcommand must stay within a time budget and never import the heavy
+dependencies only some subcommands need.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "mirrortorrent")
+
+# Seconds `mirrortorrent parse -h` may take, interpreter startup included.
+STARTUP_BUDGET = 1.0
+
+HEAVY_MODULES = ("paramiko", "torf", "scp", "matplotlib")
+
+
+def run_cli(*args):
+    """
+    Runs the CLI with -X importtime, and returns the completed process
+    and the wall-clock time it took.
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", CLI] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return process, time.perf_counter() - start
+
+
+def imported_modules(importtime_log):
+    """
+    Returns the top-level packages of the modules in the output of
+    -X importtime ("import time: self | cumulative | module" lines).
+    """
+    modules = set()
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        module = line.rsplit("|", 1)[-1].strip()
+        modules.add(module.split(".")[0])
+    return modules
+
+
+class TestCLIStartup(unittest.TestCase):
+    def test_parse_help_is_fast(self):
+        process, elapsed = run_cli("parse", "-h")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn("usage:", process.stdout)
+        self.assertLess(elapsed, STARTUP_BUDGET)
+
+    def test_parse_help_imports_no_heavy_modules(self):
+        process, elapsed = run_cli("parse", "-h")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        modules = imported_modules(process.stderr)
+        self.assertIn("runpy", modules)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
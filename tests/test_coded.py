@@ -0,0 +1,54 @@
+"""
+Checks the coded-data model (mtsim/coded.py).
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+SIMULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mirrortorrent")
+sys.path.insert(0, SIMULATOR_DIR)
+
+from mtsim.coded import FIELD, Subspace, relax_coded_greedy, run_coded_simulation
+from mtsim.graph import make_boring_graph
+
+
+class TestSubspace(unittest.TestCase):
+    def test_reduce_and_add(self):
+        rng = np.random.default_rng(1)
+        span = Subspace(6)
+        vectors = rng.integers(FIELD, size=(4, 6))
+        for vector in vectors:
+            self.assertTrue(span.add(span.reduce(vector)))
+        self.assertEqual(len(span), 4)
+
+        # Combinations of the vectors added are in the subspace.
+        combination = rng.integers(FIELD, size=4) @ vectors % FIELD
+        self.assertFalse(span.reduce(combination).any())
+        self.assertFalse(span.add(span.reduce(combination)))
+
+        # The rows are in reduced row echelon form.
+        self.assertTrue((span.rows[:, span.pivots] == np.eye(4, dtype=np.int64)).all())
+
+
+class TestCodedSimulation(unittest.TestCase):
+    def test_exact_between_the_estimates(self):
+        all_data = set(range(60))
+        times = {
+            model: run_coded_simulation(
+                make_boring_graph(6, all_data, 6, 3),
+                len(all_data),
+                relax_coded_greedy,
+                model=model,
+                seed=1,
+            )
+            for model in ("exact", "nested", "generic")
+        }
+        self.assertLessEqual(times["generic"], times["exact"])
+        self.assertLessEqual(times["exact"], times["nested"])
+
+
+if __name__ == "__main__":
+    unittest.main()
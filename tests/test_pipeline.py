@@ -0,0 +1,71 @@
+"""
+Checks the pipelined transfer mode (mtsim/pipeline.py).
+"""
+
+import os
+import sys
+import unittest
+
+SIMULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mirrortorrent")
+sys.path.insert(0, SIMULATOR_DIR)
+
+from mtsim.pipeline import relay_pass
+from mtsim.relaxations import relax_send_greedy
+from mtsim.simulation import run_simulation
+from mtsim.topology import Topology
+from mtsim.utils import (
+    apply_transfers,
+    commit_buffer,
+    reset_utils,
+    send,
+    set_trusted,
+    start_time_step,
+)
+
+
+def make_chain(num_nodes, bw):
+    """
+    Returns a Topology where node i only links to node i+1, with
+    capacity bw.
+    """
+    edges = [
+        [bw if j == i + 1 else 0 for j in range(num_nodes)] for i in range(num_nodes)
+    ]
+    return Topology([bw] * num_nodes, edges)
+
+
+class TestRelayPass(unittest.TestCase):
+    def test_chain_completes_in_one_tick(self):
+        G = make_chain(6, 5)
+        G.nodes[0]["data"] = {0}
+        time = run_simulation(G, {0}, relax_send_greedy, pipelined=True, seed=1)
+        self.assertEqual(time, 1)
+
+    def test_data_held_before_the_tick_is_not_relayed(self):
+        all_data = {0, 1}
+        G = make_chain(3, 5)
+        G.nodes[0]["data"] = set(all_data)
+        set_trusted(G, True)
+
+        # Piece 1 reaches node 1 during a first time step. Its buffer
+        # keeps it after the commit.
+        start_time_step(G, all_data, 0)
+        send(G, 0, 1, {1})
+        apply_transfers(G)
+        reset_utils(G)
+        commit_buffer(G)
+        self.assertEqual(G.states[1].buffer, {1})
+
+        start_time_step(G, all_data, 1)
+        send(G, 0, 1, {0})
+        relay_pass(G)
+
+        relayed = set()
+        for sender, reciever, data in G.graph["transfers"]:
+            if sender == 1:
+                relayed |= data
+        self.assertEqual(relayed, {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Checks the topology cache (mtsim/topocache.py) and the graphs it loads.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+SIMULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mirrortorrent")
+sys.path.insert(0, SIMULATOR_DIR)
+
+from mtsim.topocache import cached_graph
+from mtsim.topology import Link
+
+
+class TestCachedGraph(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def cached_highlow(self):
+        return cached_graph(
+            "highlow",
+            {0, 1},
+            cache_dir=self.cache_dir,
+            num_high_bw_nodes=2,
+            num_low_bw_nodes=3,
+            high_bw=10,
+            low_bw=4,
+            high_cap=5,
+            low_cap=2,
+        )
+
+    def test_hit_matches_the_built_graph(self):
+        built = self.cached_highlow()
+        cached = self.cached_highlow()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        for node in built:
+            self.assertEqual(cached.nodes[node]["bw"], built.nodes[node]["bw"])
+            self.assertEqual(list(cached.neighbors(node)), list(built.neighbors(node)))
+            self.assertEqual(
+                {n: link.weight for n, link in cached.links[node].items()},
+                {n: link.weight for n, link in built.links[node].items()},
+            )
+            self.assertNotIn(node, cached[node])
+        self.assertEqual(cached.nodes[0]["data"], {0, 1})
+
+    def test_replacing_a_link_only_changes_that_link(self):
+        self.cached_highlow()
+        G = self.cached_highlow()
+        with self.assertRaises(TypeError):
+            G[0][1]["weight"] = 99
+        G.links[0][1] = Link(99)
+        self.assertEqual(G[0][1]["weight"], 99)
+        self.assertEqual(G[1][0]["weight"], 5)
+        self.assertEqual(G[2][1]["weight"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()